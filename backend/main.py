@@ -5,17 +5,33 @@ Main application entry point with REST and WebSocket endpoints
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Optional
 import uvicorn
 import asyncio
-import json
+import multiprocessing
 import os
+import tempfile
+import aiofiles
+import orjson
+import yaml
 from datetime import datetime
 
-from services.marker_engine import MarkerEngine
-from services.mongodb_service import MongoDBService
+try:
+    import uvloop
+except ImportError:  # Windows / minimal installs fall back to the default loop
+    uvloop = None
+
+try:
+    from yaml import CSafeDumper as YamlDumper  # libyaml C binding
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+from services.marker_engine import MarkerEngine, MarkerDefinition, mark_pool_worker, shutdown_scan_pool
+from services.mongodb_service import MongoDBService, EVENT_PROJECTION
 from services.websocket_manager import WebSocketManager
 from services.file_processor import FileProcessor
 from models.schemas import (
@@ -25,6 +41,7 @@ from models.schemas import (
     EmotionMetrics
 )
 from utils.logger import setup_logger
+from utils.batching import BatchWriter
 
 # Setup logging
 logger = setup_logger(__name__)
@@ -35,6 +52,41 @@ marker_engine = MarkerEngine(db_service)
 ws_manager = WebSocketManager()
 file_processor = FileProcessor()
 
+# Timestamp refresh interval for health/stats responses
+CLOCK_TICK_SECONDS = 0.1
+
+async def refresh_clock(app: FastAPI):
+    """Keep app.state.now_iso current so hot endpoints skip formatting a datetime"""
+    while True:
+        app.state.now_iso = datetime.utcnow().isoformat()
+        await asyncio.sleep(CLOCK_TICK_SECONDS)
+
+# Processes used for CPU-bound marker analysis
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+
+# Per-process engine used by analysis pool workers
+_worker_engine: Optional[MarkerEngine] = None
+
+def _init_analysis_worker(markers: List[MarkerDefinition]):
+    """Give each pool worker its own engine loaded with the parent's marker definitions"""
+    global _worker_engine
+    mark_pool_worker()
+    _worker_engine = MarkerEngine(None)
+    _worker_engine.markers = {marker.id: marker for marker in markers}
+    _worker_engine.is_initialized = True
+
+def _analyze_sync(
+    content: str,
+    context: Optional[Dict[str, Any]],
+    options: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Run a full marker analysis inside a pool worker"""
+    return asyncio.run(_worker_engine.analyze(content=content, context=context, options=options))
+
+def _warm_up_worker() -> int:
+    """No-op task that forces a worker process to start"""
+    return os.getpid()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifecycle management"""
@@ -42,12 +94,32 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting Marker Engine Backend...")
     await db_service.connect()
     await marker_engine.initialize()
+    app.state.now_iso = datetime.utcnow().isoformat()
+    clock_task = asyncio.create_task(refresh_clock(app))
+    
+    # Analysis runs off the event loop; pre-warm so the first request skips process start-up.
+    # Workers are spawned, not forked: a fork would copy this running event loop and its
+    # thread state into a child that then calls asyncio.run()
+    app.state.pool = ProcessPoolExecutor(
+        max_workers=ANALYSIS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_analysis_worker,
+        initargs=(list(marker_engine.markers.values()),)
+    )
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(app.state.pool, _warm_up_worker)
+        for _ in range(ANALYSIS_WORKERS)
+    ))
     logger.info("✅ Marker Engine Backend started successfully")
     
     yield
     
     # Shutdown
     logger.info("🔌 Shutting down Marker Engine Backend...")
+    clock_task.cancel()
+    app.state.pool.shutdown(cancel_futures=True)
+    shutdown_scan_pool()
     await db_service.disconnect()
     await ws_manager.disconnect_all()
     logger.info("✅ Marker Engine Backend stopped")
@@ -57,7 +129,8 @@ app = FastAPI(
     title="Marker Engine API",
     description="Lean-Deep 3.2 Semantic Analysis System",
     version="3.2.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -93,7 +166,7 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": app.state.now_iso,
         "services": {
             "database": await db_service.health_check(),
             "marker_engine": marker_engine.is_initialized,
@@ -126,7 +199,7 @@ async def upload_file(file: UploadFile = File(...)):
             "size": file_info["size"],
             "type": file_info["type"]
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -139,11 +212,14 @@ async def analyze_content(request: AnalysisRequest):
     try:
         logger.info(f"🔍 Starting analysis for session: {request.session_id}")
         
-        # Run marker analysis
-        analysis_result = await marker_engine.analyze(
-            content=request.content,
-            context=request.context,
-            options=request.options
+        # Run marker analysis in the process pool so the event loop stays responsive
+        loop = asyncio.get_running_loop()
+        analysis_result = await loop.run_in_executor(
+            app.state.pool,
+            _analyze_sync,
+            request.content,
+            request.context,
+            request.options
         )
         
         # Store results in database
@@ -152,12 +228,12 @@ async def analyze_content(request: AnalysisRequest):
             result=analysis_result
         )
         
-        # Broadcast to WebSocket clients
-        await ws_manager.broadcast({
+        # Notify WebSocket clients subscribed to this session
+        await ws_manager.broadcast_to_session({
             "type": "analysis_complete",
             "session_id": request.session_id,
             "result": analysis_result
-        })
+        }, request.session_id)
         
         return AnalysisResponse(
             session_id=request.session_id,
@@ -166,7 +242,7 @@ async def analyze_content(request: AnalysisRequest):
             timeline=analysis_result["timeline"],
             profile=analysis_result["profile"]
         )
-        
+    
     except Exception as e:
         logger.error(f"❌ Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -186,14 +262,19 @@ async def get_markers(
             filters["category"] = category
         if level:
             filters["level"] = level  # ATO, SEM, CLU, MEMA
-            
-        markers = await db_service.get_markers(filters, limit)
+        
+        # Projection matches the (category, level, id) index -> covered query
+        markers = await db_service.get_markers(
+            filters,
+            limit,
+            projection={"_id": 0, "id": 1, "level": 1, "category": 1}
+        )
         
         return {
             "total": len(markers),
             "markers": markers
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Error fetching markers: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -211,7 +292,8 @@ async def get_events(
         events = await db_service.get_events(
             session_id=session_id,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            projection=EVENT_PROJECTION
         )
         
         return {
@@ -219,7 +301,7 @@ async def get_events(
             "total": len(events),
             "events": events
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ Error fetching events: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -234,13 +316,32 @@ async def get_emotion_dynamics(session_id: str):
         
         if not emotions:
             raise HTTPException(status_code=404, detail="Session not found")
-            
-        return emotions
         
+        return emotions
+    
     except Exception as e:
         logger.error(f"❌ Error fetching emotions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/emotions/{session_id}/summary")
+async def get_emotion_summary(session_id: str):
+    """
+    Get headline EmotionDynamics figures for a session
+    """
+    try:
+        summary = await db_service.get_emotion_summary(session_id)
+        
+        if not summary:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        return summary
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error fetching emotion summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/export/{session_id}")
 async def export_analysis(
     session_id: str,
@@ -258,28 +359,45 @@ async def export_analysis(
         
         # Format based on request
         if format == "yaml":
-            import yaml
-            export_content = yaml.dump(analysis_data, default_flow_style=False)
+            export_content = yaml.dump(
+                analysis_data, Dumper=YamlDumper, default_flow_style=False, sort_keys=False
+            ).encode("utf-8")
             media_type = "application/x-yaml"
+            extension = "yaml"
         else:
-            export_content = json.dumps(analysis_data, indent=2)
+            export_content = orjson.dumps(analysis_data, option=orjson.OPT_INDENT_2)
             media_type = "application/json"
+            extension = "json"
         
-        return JSONResponse(
-            content={
-                "session_id": session_id,
-                "format": format,
-                "data": export_content
-            },
-            media_type=media_type
-        )
+        # Spool the export to disk so FileResponse can stream it with sendfile
+        fd, export_path = tempfile.mkstemp(prefix="export_", suffix=f".{extension}")
+        os.close(fd)
+        async with aiofiles.open(export_path, "wb") as export_file:
+            await export_file.write(export_content)
         
+        return FileResponse(
+            export_path,
+            media_type=media_type,
+            filename=f"{session_id}.{extension}",
+            background=BackgroundTask(os.remove, export_path)
+        )
+    
     except Exception as e:
         logger.error(f"❌ Export error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ================== WebSocket Endpoint ==================
 
+async def receive_message(websocket: WebSocket):
+    """Read one frame and parse it, accepting both binary and text frames"""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    data = frame.get("bytes")
+    if data is None:
+        data = frame.get("text")
+    return orjson.loads(data)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -289,41 +407,60 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             # Receive message from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await receive_message(websocket)
             
             # Handle different message types
             if message["type"] == "subscribe":
                 session_id = message.get("session_id")
                 await ws_manager.subscribe(websocket, session_id)
-                await websocket.send_json({
+                await ws_manager.send_personal_message({
                     "type": "subscribed",
                     "session_id": session_id
-                })
-                
+                }, websocket)
+            
             elif message["type"] == "analyze_stream":
                 # Stream analysis in real-time
                 content = message.get("content")
                 session_id = message.get("session_id")
                 
                 # Run analysis with streaming
-                async for event in marker_engine.analyze_stream(content):
-                    await websocket.send_json({
-                        "type": "marker_event",
-                        "session_id": session_id,
-                        "event": event
-                    })
-                    
+                await stream_marker_events(websocket, session_id, content)
+            
             elif message["type"] == "ping":
-                await websocket.send_json({"type": "pong"})
-                
+                await ws_manager.send_personal_message({"type": "pong"}, websocket)
+    
     except WebSocketDisconnect:
-        ws_manager.disconnect(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
+    finally:
+        # Runs on every exit path, including cancellation
         ws_manager.disconnect(websocket)
 
+# Streamed events produced within this window are sent as one frame
+STREAM_BATCH_SIZE = 64
+STREAM_BATCH_WINDOW = 0.02
+
+async def stream_marker_events(websocket: WebSocket, session_id: Optional[str], content: str):
+    """
+    Run a streaming analysis and coalesce its events into "marker_events" frames
+    """
+    async def send_events(events: List[Dict[str, Any]]):
+        await ws_manager.send_personal_message({
+            "type": "marker_events",
+            "session_id": session_id,
+            "events": events
+        }, websocket)
+    
+    writer = BatchWriter(send_events, STREAM_BATCH_SIZE, STREAM_BATCH_WINDOW, name="marker_events")
+    writer.start()
+    try:
+        async for event in marker_engine.analyze_stream(content):
+            await writer.put(event)
+    finally:
+        # Sends whatever is still buffered
+        await writer.stop()
+
 # ================== Background Tasks ==================
 
 async def process_file_background(file_info: Dict[str, Any]):
@@ -337,11 +474,11 @@ async def process_file_background(file_info: Dict[str, Any]):
         if file_info["type"] == "whatsapp_zip":
             # Extract and process WhatsApp chat
             await file_processor.process_whatsapp_zip(file_info)
-            
+        
         elif file_info["type"] == "audio":
             # Process audio file with STT
             await file_processor.process_audio_file(file_info)
-            
+        
         elif file_info["type"] == "text":
             # Process text directly
             content = await file_processor.read_text_file(file_info)
@@ -359,7 +496,7 @@ async def process_file_background(file_info: Dict[str, Any]):
             "file_id": file_info["file_id"],
             "status": "complete"
         })
-        
+    
     except Exception as e:
         logger.error(f"❌ Background processing error: {str(e)}")
         await db_service.update_file_status(
@@ -401,5 +538,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=os.getenv("ENVIRONMENT") == "development",
-        log_level="info"
+        log_level="info",
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+        backlog=2048
     )
\ No newline at end of file
@@ -5,22 +5,59 @@ Simplified for 512MB RAM constraint
 """
 
 import os
+import re
 import sys
+import mmap
+import time
+import asyncio
 import logging
+import multiprocessing
+import tempfile
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from pathlib import Path
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
 import yaml
-import json
+import orjson
+import msgspec
+import aiofiles
 from dotenv import load_dotenv
 
+from utils.batching import BatchWriter
+
+try:
+    import uvloop
+except ImportError:  # Windows / minimal installs fall back to the default loop
+    uvloop = None
+
+try:
+    from yaml import CSafeDumper as YamlDumper  # libyaml C binding
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+try:
+    import ahocorasick
+except ImportError:  # Falls back to per-word substring checks
+    ahocorasick = None
+
+# RE2's \b only treats ASCII letters and digits as word characters, so next to
+# non-ASCII letters (e.g. "über", "été") marker boundaries can differ from re
+try:
+    import re2 as regex_engine  # google-re2: linear-time matching, no catastrophic backtracking
+except ImportError:
+    regex_engine = re
+
 # Load environment variables
 load_dotenv()
 
@@ -39,14 +76,96 @@ class Config:
     MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))  # 10MB
     ENABLE_WEBSOCKET = os.getenv("ENABLE_WEBSOCKET", "true").lower() == "true"
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # Uploads are spooled to disk in 64KB chunks
+    PARALLEL_SCAN_THRESHOLD = 256_000  # Longer texts are scanned in chunks on a process pool
+    SCAN_CHUNK_OVERLAP = 256  # Covers matches that straddle a chunk boundary
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 0))  # Scan pool size; 0 scans long texts in a thread
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))  # uvicorn worker processes
+    WRITE_BATCH_SIZE = 500  # Max analyses per insert_many
+    WRITE_FLUSH_INTERVAL = 0.1  # Seconds to wait for a batch to fill
+    ACCESS_LOG = os.getenv("ACCESS_LOG", "true").lower() == "true"
+    ACCESS_LOG_BATCH_SIZE = 100  # Max access log lines per stderr write
+    ACCESS_LOG_FLUSH_INTERVAL = 0.2  # Seconds to wait for a batch to fill
     
 config = Config()
 
+# Timestamp refresh interval for health/stats responses
+CLOCK_TICK_SECONDS = 0.1
+
+async def refresh_clock(app: FastAPI):
+    """Keep app.state.now_iso current so hot endpoints skip formatting a datetime"""
+    while True:
+        app.state.now_iso = datetime.utcnow().isoformat()
+        await asyncio.sleep(CLOCK_TICK_SECONDS)
+
+async def write_access_log(batch: List[Dict[str, Any]]):
+    """Write a batch of access log records to stderr as JSON lines"""
+    sys.stderr.buffer.write(b"".join(orjson.dumps(record) + b"\n" for record in batch))
+    sys.stderr.buffer.flush()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifecycle management
+    
+    The MongoDB client is created here rather than at import so every uvicorn
+    worker opens its own sockets after the fork.
+    """
+    # Startup
+    app.state.mongo_client = None
+    app.state.db = None
+    app.state.now_iso = datetime.utcnow().isoformat()
+    clock_task = asyncio.create_task(refresh_clock(app))
+    try:
+        app.state.mongo_client = AsyncIOMotorClient(config.MONGODB_URI)
+        await app.state.mongo_client.admin.command('ping')
+        app.state.db = app.state.mongo_client.marker_engine
+        logger.info("✅ Connected to MongoDB")
+    except Exception as e:
+        logger.warning(f"⚠️ MongoDB connection failed: {e}. Running without database.")
+    
+    # Analyses are stored with unordered insert_many batches
+    app.state.analysis_writer = None
+    if app.state.db is not None:
+        app.state.analysis_writer = BatchWriter(
+            partial(app.state.db.analyses.insert_many, ordered=False),
+            config.WRITE_BATCH_SIZE,
+            config.WRITE_FLUSH_INTERVAL,
+            name="analyses"
+        )
+        app.state.analysis_writer.start()
+    
+    app.state.access_log = None
+    if config.ACCESS_LOG:
+        app.state.access_log = BatchWriter(
+            write_access_log,
+            config.ACCESS_LOG_BATCH_SIZE,
+            config.ACCESS_LOG_FLUSH_INTERVAL,
+            name="access log"
+        )
+        app.state.access_log.start()
+    
+    yield
+    
+    # Shutdown
+    clock_task.cancel()
+    # Both writers flush the in-flight batch and everything still queued
+    if app.state.analysis_writer:
+        await app.state.analysis_writer.stop()
+    if app.state.access_log:
+        await app.state.access_log.stop()
+    if app.state.mongo_client:
+        app.state.mongo_client.close()
+        logger.info("MongoDB connection closed")
+    if _scan_pool is not None:
+        _scan_pool.shutdown(cancel_futures=True)
+
 # FastAPI app
 app = FastAPI(
     title="Marker Engine - Glitch Edition",
     version="1.0.0-glitch",
-    description="Lightweight Lean-Deep 3.2 Marker Analysis for Glitch deployment"
+    description="Lightweight Lean-Deep 3.2 Marker Analysis for Glitch deployment",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -58,15 +177,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB client
-mongo_client: Optional[AsyncIOMotorClient] = None
-db = None
+def get_db(request: Request):
+    """Per-worker MongoDB database handle (None when running without a database)"""
+    return request.app.state.db
+
+@app.middleware("http")
+async def access_log_middleware(request: Request, call_next):
+    """Queue one structured access log record per request, including failed ones"""
+    started = time.monotonic()
+    status = 500  # Reported when the handler raises
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        access_log = getattr(app.state, "access_log", None)
+        if access_log is not None:
+            access_log.put_nowait({
+                "ts": app.state.now_iso,
+                "client": request.client.host if request.client else None,
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "duration_ms": round((time.monotonic() - started) * 1000, 2)
+            })
+
+# Request schema, decoded and validated straight from the body bytes by msgspec
+class AnalysisRequest(msgspec.Struct):
+    content: str  # Text content to analyze
+    context: Optional[Dict[str, Any]] = {}  # Additional context
+    options: Optional[Dict[str, Any]] = {}  # Analysis options
+
+async def decode_analysis_request(request: Request) -> AnalysisRequest:
+    """Decode the JSON body into an AnalysisRequest, bypassing Pydantic validation"""
+    try:
+        return msgspec.json.decode(await request.body(), type=AnalysisRequest)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
 
 # Pydantic models
-class AnalysisRequest(BaseModel):
-    content: str = Field(..., description="Text content to analyze")
-    context: Optional[Dict[str, Any]] = Field(default={}, description="Additional context")
-    options: Optional[Dict[str, Any]] = Field(default={}, description="Analysis options")
 
 class MarkerEvent(BaseModel):
     marker_id: str
@@ -111,40 +262,124 @@ MARKER_PATTERNS = {
     }
 }
 
+# Emotion vocabulary for the lightweight valence score
+POSITIVE_WORDS = ("good", "happy", "great", "love", "excellent", "wonderful")
+NEGATIVE_WORDS = ("bad", "sad", "angry", "hate", "terrible", "awful")
+
+def build_emotion_automaton():
+    """Build an Aho-Corasick automaton that finds every emotion word in one pass"""
+    automaton = ahocorasick.Automaton()
+    for word in POSITIVE_WORDS:
+        automaton.add_word(word, ("pos", word))
+    for word in NEGATIVE_WORDS:
+        automaton.add_word(word, ("neg", word))
+    automaton.make_automaton()
+    return automaton
+
+EMOTION_AUTOMATON = build_emotion_automaton() if ahocorasick else None
+
+def compile_level(level: str, flags: int = 0):
+    """Merge a level's patterns into one alternation of named groups"""
+    return regex_engine.compile(
+        "|".join(f"(?P<{marker_id}>{pattern})" for marker_id, pattern in MARKER_PATTERNS[level].items()),
+        flags
+    )
+
+# Compiled once at import; a single pass over the text finds every marker of a level.
+# ATO patterns are lowercase and run against the pre-lowercased text.
+LEVEL_RES = {
+    "ATO": compile_level("ATO"),
+    "SEM": compile_level("SEM"),
+}
+
+def scan_chunk(level: str, text: str, pos: int, is_tail: bool) -> set:
+    """Collect the marker IDs of a level in one chunk (runs in a pool worker)
+
+    Scanning starts at `pos` so the leading overlap only serves as look-behind
+    context; matches touching the end of a non-tail chunk are ignored because
+    the text may continue past the cut.
+    """
+    return {
+        match.lastgroup for match in LEVEL_RES[level].finditer(text, pos)
+        if is_tail or match.end() < len(text)
+    }
+
+_scan_pool: Optional[ProcessPoolExecutor] = None
+
+def get_scan_pool() -> ProcessPoolExecutor:
+    """Lazily start the process pool used for long inputs"""
+    global _scan_pool
+    if _scan_pool is None:
+        # Spawned, not forked: the server process already runs threads and an event loop
+        _scan_pool = ProcessPoolExecutor(
+            max_workers=config.SCAN_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _scan_pool
+
 class SimpleMarkerEngine:
     """Lightweight marker engine for Glitch constraints"""
     
     def __init__(self):
         self.patterns = MARKER_PATTERNS
+    
+    async def _scan(self, level: str, content: str) -> List[str]:
+        """Return the marker IDs of a level found in the content, in definition order"""
+        if len(content) <= config.PARALLEL_SCAN_THRESHOLD:
+            found = {match.lastgroup for match in LEVEL_RES[level].finditer(content)}
+        elif config.SCAN_WORKERS > 0:
+            found = await self._scan_parallel(level, content)
+        else:
+            # No pool configured (the 512MB default): keep the event loop free
+            found = await asyncio.to_thread(scan_chunk, level, content, 0, True)
+        return [marker_id for marker_id in self.patterns[level] if marker_id in found]
+    
+    async def _scan_parallel(self, level: str, content: str) -> set:
+        """Scan a long text in overlapping chunks on the process pool"""
+        loop = asyncio.get_running_loop()
+        chunk_size = config.PARALLEL_SCAN_THRESHOLD
+        overlap = config.SCAN_CHUNK_OVERLAP
+        jobs = []
+        
+        for start in range(0, len(content), chunk_size):
+            slice_start = max(0, start - overlap)
+            slice_end = start + chunk_size + overlap
+            jobs.append(loop.run_in_executor(
+                get_scan_pool(),
+                scan_chunk,
+                level,
+                content[slice_start:slice_end],
+                start - slice_start,
+                slice_end >= len(content)
+            ))
+        
+        return set().union(*await asyncio.gather(*jobs))
         
     async def analyze(self, content: str, context: Optional[Dict] = None) -> Dict:
         """Simple pattern-based analysis"""
-        import re
-        
         markers = []
+        content_lower = content.lower()  # Shared by the ATO scan and emotion scoring
         
         # ATO level - direct pattern matching
-        for marker_id, pattern in self.patterns["ATO"].items():
-            if re.search(pattern, content.lower()):
-                markers.append({
-                    "marker_id": marker_id,
-                    "level": "ATO",
-                    "confidence": 0.8,
-                    "content": content[:50]
-                })
+        for marker_id in await self._scan("ATO", content_lower):
+            markers.append({
+                "marker_id": marker_id,
+                "level": "ATO",
+                "confidence": 0.8,
+                "content": content[:50]
+            })
         
         # SEM level - semantic patterns
-        for marker_id, pattern in self.patterns["SEM"].items():
-            if isinstance(pattern, str) and re.search(pattern, content):
-                markers.append({
-                    "marker_id": marker_id,
-                    "level": "SEM",
-                    "confidence": 0.7,
-                    "content": content[:50]
-                })
+        for marker_id in await self._scan("SEM", content):
+            markers.append({
+                "marker_id": marker_id,
+                "level": "SEM",
+                "confidence": 0.7,
+                "content": content[:50]
+            })
         
         # Simple emotion detection
-        emotion_score = self._calculate_emotion(content)
+        emotion_score = self._calculate_emotion(content_lower)
         
         return {
             "markers": markers,
@@ -166,14 +401,26 @@ class SimpleMarkerEngine:
             }
         }
     
-    def _calculate_emotion(self, text: str) -> float:
-        """Simple emotion scoring"""
-        positive_words = ["good", "happy", "great", "love", "excellent", "wonderful"]
-        negative_words = ["bad", "sad", "angry", "hate", "terrible", "awful"]
-        
-        text_lower = text.lower()
-        pos_count = sum(1 for word in positive_words if word in text_lower)
-        neg_count = sum(1 for word in negative_words if word in text_lower)
+    async def analyze_file(self, path: str, context: Optional[Dict] = None) -> Dict:
+        """Analyze a file on disk, decoding it straight from a read-only memory map"""
+        with open(path, "rb") as file_handle:
+            if os.fstat(file_handle.fileno()).st_size == 0:
+                content = ""
+            else:
+                with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    content = str(mapped, "utf-8", "ignore")
+        return await self.analyze(content, context)
+    
+    def _calculate_emotion(self, text_lower: str) -> float:
+        """Simple emotion scoring over already-lowercased text"""
+        if EMOTION_AUTOMATON is not None:
+            # Each vocabulary word counts once, however often it occurs
+            hits = {value for _, value in EMOTION_AUTOMATON.iter(text_lower)}
+            pos_count = sum(1 for kind, _ in hits if kind == "pos")
+            neg_count = len(hits) - pos_count
+        else:
+            pos_count = sum(1 for word in POSITIVE_WORDS if word in text_lower)
+            neg_count = sum(1 for word in NEGATIVE_WORDS if word in text_lower)
         
         if pos_count + neg_count == 0:
             return 0.5
@@ -183,29 +430,9 @@ class SimpleMarkerEngine:
 # Initialize marker engine
 marker_engine = SimpleMarkerEngine()
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    global mongo_client, db
-    try:
-        mongo_client = AsyncIOMotorClient(config.MONGODB_URI)
-        db = mongo_client.marker_engine
-        await mongo_client.admin.command('ping')
-        logger.info("✅ Connected to MongoDB")
-    except Exception as e:
-        logger.warning(f"⚠️ MongoDB connection failed: {e}. Running without database.")
-        db = None
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    if mongo_client:
-        mongo_client.close()
-        logger.info("MongoDB connection closed")
-
 # Routes
 @app.get("/")
-async def root():
+async def root(db=Depends(get_db)):
     return {
         "name": "Marker Engine - Glitch Edition",
         "version": "1.0.0-glitch",
@@ -218,31 +445,31 @@ async def root():
     }
 
 @app.get("/health")
-async def health_check():
+async def health_check(db=Depends(get_db)):
     status = {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "database": "connected" if db else "disconnected",
+        "timestamp": app.state.now_iso,
+        "database": "connected" if db is not None else "disconnected",
         "memory_usage": get_memory_usage()
     }
     return status
 
 @app.post("/api/analyze")
-async def analyze_content(request: AnalysisRequest):
+async def analyze_content(request: AnalysisRequest = Depends(decode_analysis_request), db=Depends(get_db)):
     """Analyze text content for markers"""
     try:
         result = await marker_engine.analyze(request.content, request.context)
         
-        # Store in database if available
-        if db:
-            await db.analyses.insert_one({
+        # Store in database if available (batched by app.state.analysis_writer)
+        if db is not None:
+            app.state.analysis_writer.put_nowait({
                 "timestamp": datetime.utcnow(),
                 "content": request.content[:500],  # Store snippet only
                 "result": result,
                 "options": request.options
             })
         
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
     except Exception as e:
         logger.error(f"Analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -250,33 +477,57 @@ async def analyze_content(request: AnalysisRequest):
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Handle file uploads"""
-    if file.size > config.MAX_UPLOAD_SIZE:
+    if file.size and file.size > config.MAX_UPLOAD_SIZE:
         raise HTTPException(400, f"File too large. Max size: {config.MAX_UPLOAD_SIZE} bytes")
     
+    fd, tmp_path = tempfile.mkstemp(prefix="upload_")
+    os.close(fd)
     try:
-        content = await file.read()
-        text_content = content.decode('utf-8', errors='ignore')
+        # Stream the body to disk so peak memory stays at one chunk
+        size = 0
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > config.MAX_UPLOAD_SIZE:
+                    raise HTTPException(400, f"File too large. Max size: {config.MAX_UPLOAD_SIZE} bytes")
+                await out.write(chunk)
         
         # Analyze the content
-        result = await marker_engine.analyze(text_content)
+        result = await marker_engine.analyze_file(tmp_path)
         
         return {
             "filename": file.filename,
-            "size": file.size,
+            "size": size,
             "analysis": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(500, str(e))
+    finally:
+        os.remove(tmp_path)
 
 @app.get("/api/markers")
-async def get_markers(limit: int = 100, skip: int = 0):
-    """Get stored markers from database"""
-    if not db:
+async def get_markers(limit: int = 100, skip: int = 0, after: Optional[str] = None, db=Depends(get_db)):
+    """Get stored markers from database (newest first; pass the last _id as `after` to page)"""
+    if db is None:
         return {"markers": [], "message": "Database not connected"}
     
+    query = {}
+    if after:
+        # Seek pagination: walks the _id index instead of skipping N documents
+        try:
+            query["_id"] = {"$lt": ObjectId(after)}
+        except InvalidId:
+            raise HTTPException(400, "Invalid pagination cursor")
+        skip = 0
+    
     try:
-        cursor = db.analyses.find({}).skip(skip).limit(limit)
+        cursor = db.analyses.find(
+            query,
+            projection={"timestamp": 1, "result.statistics": 1}
+        ).sort("_id", -1).skip(skip).limit(limit)
         markers = []
         async for doc in cursor:
             doc["_id"] = str(doc["_id"])
@@ -287,6 +538,16 @@ async def get_markers(limit: int = 100, skip: int = 0):
         logger.error(f"Database error: {e}")
         raise HTTPException(500, str(e))
 
+async def receive_message(websocket: WebSocket):
+    """Read one frame and parse it, accepting both binary and text frames"""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    data = frame.get("bytes")
+    if data is None:
+        data = frame.get("text")
+    return orjson.loads(data)
+
 # WebSocket endpoint (if enabled)
 if config.ENABLE_WEBSOCKET:
     @app.websocket("/ws")
@@ -296,18 +557,17 @@ if config.ENABLE_WEBSOCKET:
         
         try:
             while True:
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                message = await receive_message(websocket)
                 
                 if message.get("type") == "analyze":
                     result = await marker_engine.analyze(
                         message.get("content", ""),
                         message.get("context")
                     )
-                    await websocket.send_json({
+                    await websocket.send_text(orjson.dumps({
                         "type": "analysis_result",
                         "result": result
-                    })
+                    }).decode())
                     
         except WebSocketDisconnect:
             logger.info("WebSocket disconnected")
@@ -327,9 +587,9 @@ def get_memory_usage():
 
 # Export endpoints for monitoring
 @app.get("/api/export/yaml")
-async def export_yaml(limit: int = 100):
+async def export_yaml(limit: int = 100, db=Depends(get_db)):
     """Export analysis results as YAML"""
-    if not db:
+    if db is None:
         return {"error": "Database not connected"}
     
     cursor = db.analyses.find({}).limit(limit)
@@ -338,23 +598,24 @@ async def export_yaml(limit: int = 100):
         doc["_id"] = str(doc["_id"])
         data.append(doc)
     
-    yaml_content = yaml.dump(data, default_flow_style=False)
+    yaml_content = yaml.dump(data, Dumper=YamlDumper, default_flow_style=False, sort_keys=False)
     return JSONResponse(
         content={"yaml": yaml_content},
         media_type="application/x-yaml"
     )
 
 @app.get("/api/stats")
-async def get_statistics():
+async def get_statistics(db=Depends(get_db)):
     """Get system statistics"""
     stats = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": app.state.now_iso,
         "memory": get_memory_usage(),
-        "database": "connected" if db else "disconnected"
+        "database": "connected" if db is not None else "disconnected"
     }
     
-    if db:
-        stats["document_count"] = await db.analyses.count_documents({})
+    if db is not None:
+        # Reads collection metadata instead of scanning every document
+        stats["document_count"] = await db.analyses.estimated_document_count()
     
     return stats
 
@@ -365,9 +626,15 @@ if __name__ == "__main__":
     logger.info(f"🔧 WebSocket: {'Enabled' if config.ENABLE_WEBSOCKET else 'Disabled'}")
     
     uvicorn.run(
-        app,
+        "main_glitch:app",
         host=config.HOST,
+        workers=config.WORKERS,
         port=config.PORT,
         log_level=os.getenv("LOG_LEVEL", "info").lower(),
-        access_log=True
+        access_log=False,  # Replaced by access_log_middleware
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+        backlog=2048
     )
\ No newline at end of file
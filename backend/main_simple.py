@@ -4,23 +4,50 @@ Simplified Marker Engine for Fly.io deployment
 """
 
 import os
+import re
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+import msgspec
 from datetime import datetime
 import uvicorn
 
+try:
+    import uvloop
+except ImportError:  # Windows / minimal installs fall back to the default loop
+    uvloop = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Timestamp refresh interval for health/stats responses
+CLOCK_TICK_SECONDS = 0.1
+
+async def refresh_clock(app: FastAPI):
+    """Keep app.state.now_iso current so hot endpoints skip formatting a datetime"""
+    while True:
+        app.state.now_iso = datetime.utcnow().isoformat()
+        await asyncio.sleep(CLOCK_TICK_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifecycle management"""
+    app.state.now_iso = datetime.utcnow().isoformat()
+    clock_task = asyncio.create_task(refresh_clock(app))
+    yield
+    clock_task.cancel()
+
 # Create FastAPI app
 app = FastAPI(
     title="Marker Engine",
     version="1.0.0",
-    description="Lean-Deep 3.2 Marker Analysis API"
+    description="Lean-Deep 3.2 Marker Analysis API",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -32,11 +59,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Word families for the basic ATO markers
+FEEL_WORDS = frozenset(("feel", "feels", "feeling", "feelings"))
+THINK_WORDS = frozenset(("think", "thinks", "thinking", "thought", "thoughts"))
+WORD_RE = re.compile(r"\w+")
+
 # Request/Response models
-class AnalysisRequest(BaseModel):
+class AnalysisRequest(msgspec.Struct):
     content: str
     context: dict = {}
 
+async def decode_analysis_request(request: Request) -> AnalysisRequest:
+    """Decode the JSON body into an AnalysisRequest, bypassing Pydantic validation"""
+    try:
+        return msgspec.json.decode(await request.body(), type=AnalysisRequest)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: str
@@ -49,7 +90,7 @@ async def root():
         "name": "Marker Engine",
         "version": "1.0.0",
         "status": "running",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": app.state.now_iso
     }
 
 # Health check endpoint
@@ -57,23 +98,24 @@ async def root():
 async def health_check():
     return HealthResponse(
         status="healthy",
-        timestamp=datetime.utcnow().isoformat(),
+        timestamp=app.state.now_iso,
         version="1.0.0"
     )
 
 # Analysis endpoint
 @app.post("/api/analyze")
-async def analyze(request: AnalysisRequest):
+async def analyze(request: AnalysisRequest = Depends(decode_analysis_request)):
     """Simple marker analysis endpoint"""
     try:
         # Simple marker detection
         markers = []
-        content_lower = request.content.lower()
+        # Tokenize once; marker checks are then set lookups
+        tokens = set(WORD_RE.findall(request.content.lower()))
         
         # Basic marker patterns
-        if "feel" in content_lower or "feeling" in content_lower:
+        if not FEEL_WORDS.isdisjoint(tokens):
             markers.append({"id": "A_FE_", "level": "ATO", "confidence": 0.8})
-        if "think" in content_lower or "thought" in content_lower:
+        if not THINK_WORDS.isdisjoint(tokens):
             markers.append({"id": "A_TH_", "level": "ATO", "confidence": 0.8})
         if "?" in request.content:
             markers.append({"id": "S_QU_", "level": "SEM", "confidence": 0.9})
@@ -103,7 +145,7 @@ async def get_stats():
         "status": "operational",
         "uptime": "N/A",
         "requests_processed": 0,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": app.state.now_iso
     }
 
 # Main entry point
@@ -117,5 +159,10 @@ if __name__ == "__main__":
         app,
         host=host,
         port=port,
-        log_level="info"
+        log_level="info",
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+        backlog=2048
     )
\ No newline at end of file
@@ -3,192 +3,270 @@
 Calculates emotional state changes and patterns over time
 """
 
-from typing import Dict, List, Any, Optional
-import math
+from typing import Dict, List, Any, Optional, Mapping
+from types import MappingProxyType
+import numpy as np
 from datetime import datetime, timedelta
 from utils.logger import setup_logger
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 logger = setup_logger(__name__)
 
+# Neutral (valence, arousal, dominance) for windows without mapped markers
+NEUTRAL_VAD = (0.0, 0.5, 0.5)
+
+# Neutral emotion state returned when there is nothing to calculate
+_DEFAULT_EMOTIONS = MappingProxyType({
+    'valence': 0.0,
+    'arousal': 0.5,
+    'dominance': 0.5,
+    'drift_rate': 0.0,
+    'stability': 1.0
+})
+
+# Windows with at least this many mapped events use the compiled kernel
+NUMBA_MIN_EVENTS = 64
+
+if njit is not None:
+    @njit('f4[:](i4[::1], f4[::1], f4[:,::1])', fastmath=True, cache=True)
+    def _accumulate(ids, weights, vad):
+        """Weighted (valence, arousal, dominance) sums plus total weight"""
+        totals = np.zeros(4, dtype=np.float32)
+        for i in range(ids.shape[0]):
+            idx = ids[i]
+            if idx < 0:
+                continue
+            w = weights[i]
+            totals[0] += vad[idx, 0] * w
+            totals[1] += vad[idx, 1] * w
+            totals[2] += vad[idx, 2] * w
+            totals[3] += w
+        return totals
+else:
+    _accumulate = None
+
+def _prefix_slot(marker_id: str) -> int:
+    """Perfect-hash slot of a marker id's "X_YY_" prefix"""
+    return (ord(marker_id[0]) ^ ord(marker_id[2]) ^ ord(marker_id[3])) & 0xFF
+
+# Emotion mappings for different marker types
+EMOTION_MAPPINGS = {
+    'A_EM_': {'valence': 0.8, 'arousal': 0.6, 'dominance': 0.5},  # Positive emotion
+    'A_FE_': {'valence': -0.5, 'arousal': 0.7, 'dominance': 0.3}, # Fear
+    'A_AN_': {'valence': -0.8, 'arousal': 0.9, 'dominance': 0.8}, # Anger
+    'S_PO_': {'valence': 0.6, 'arousal': 0.4, 'dominance': 0.6},  # Positive sentiment
+    'S_NE_': {'valence': -0.6, 'arousal': 0.5, 'dominance': 0.4}, # Negative sentiment
+    'C_MO_': {'valence': 0.0, 'arousal': 0.3, 'dominance': 0.5},  # Mood cluster
+}
+
+# Same mappings as a contiguous (valence, arousal, dominance) table,
+# addressed by row index so window reductions run vectorized
+_MARKER_IDX = {marker_id: i for i, marker_id in enumerate(EMOTION_MAPPINGS)}
+_VAD_TABLE = np.array(
+    [[v['valence'], v['arousal'], v['dominance']] for v in EMOTION_MAPPINGS.values()],
+    dtype=np.float32
+)
+
+# Collision-free slot table over the fixed "X_YY_" prefix layout, so
+# the per-event lookup is a few ord() calls instead of dict hashing
+_PERFECT = [None] * 256
+for _prefix, _row in _MARKER_IDX.items():
+    if _PERFECT[_prefix_slot(_prefix)] is not None:
+        raise ValueError(f"Emotion mapping prefix collision: {_prefix}")
+    _PERFECT[_prefix_slot(_prefix)] = (_prefix, _row)
+
 class EmotionDynamicsCalculator:
     """Calculates emotion dynamics from marker events"""
     
-    def __init__(self):
-        # Emotion mappings for different marker types
-        self.emotion_mappings = {
-            'A_EM_': {'valence': 0.8, 'arousal': 0.6, 'dominance': 0.5},  # Positive emotion
-            'A_FE_': {'valence': -0.5, 'arousal': 0.7, 'dominance': 0.3}, # Fear
-            'A_AN_': {'valence': -0.8, 'arousal': 0.9, 'dominance': 0.8}, # Anger
-            'S_PO_': {'valence': 0.6, 'arousal': 0.4, 'dominance': 0.6},  # Positive sentiment
-            'S_NE_': {'valence': -0.6, 'arousal': 0.5, 'dominance': 0.4}, # Negative sentiment
-            'C_MO_': {'valence': 0.0, 'arousal': 0.3, 'dominance': 0.5},  # Mood cluster
-        }
+    emotion_mappings = EMOTION_MAPPINGS
+    
+    def _lookup_row(self, marker_id: str) -> int:
+        """Row index of the mapping whose prefix starts marker_id, or -1"""
+        if len(marker_id) < 5:
+            return -1
+        entry = _PERFECT[_prefix_slot(marker_id)]
+        if entry is not None and marker_id.startswith(entry[0]):
+            return entry[1]
+        return -1
     
     def calculate(self, events: List[Any], time_window: int = 300) -> Dict[str, Any]:
         """Calculate emotion dynamics from marker events"""
         try:
             if not events:
-                return self._default_emotions()
+                return dict(_DEFAULT_EMOTIONS)
             
-            logger.debug(f"📊 Calculating emotions for {len(events)} events")
+            logger.debug("📊 Calculating emotions for %d events", len(events))
             
             # Group events by time windows
             time_series = self._create_time_series(events, time_window)
             
-            # Calculate emotion values for each time window
-            emotion_timeline = []
-            for timestamp, window_events in time_series.items():
-                emotions = self._calculate_window_emotions(window_events)
-                emotion_timeline.append({
-                    'timestamp': timestamp,
-                    'emotions': emotions
-                })
+            # Window emotions are kept as parallel timestamps and (T, 3) rows;
+            # dicts are only built for the windows returned in the response
+            timestamps = list(time_series)
+            vad = np.empty((len(timestamps), 3), dtype=np.float32)
+            for i, window_events in enumerate(time_series.values()):
+                self._window_vad(window_events, vad[i])
             
             # Calculate overall metrics
-            if emotion_timeline:
-                overall = self._calculate_overall_emotions(emotion_timeline)
-                drift_rate = self._calculate_drift_rate(emotion_timeline)
-                stability = self._calculate_stability(emotion_timeline)
+            if len(timestamps):
+                overall, drift_rate, stability = self._summarize(vad)
             else:
                 overall = self._default_emotions()
                 drift_rate = 0.0
                 stability = 1.0
             
+            # Last 10 windows
+            timeline = [
+                {
+                    'timestamp': timestamps[i],
+                    'emotions': {
+                        'valence': float(vad[i, 0]),
+                        'arousal': float(vad[i, 1]),
+                        'dominance': float(vad[i, 2])
+                    }
+                }
+                for i in range(max(0, len(timestamps) - 10), len(timestamps))
+            ]
+            
             return {
                 'valence': overall['valence'],
                 'arousal': overall['arousal'],
                 'dominance': overall['dominance'],
                 'drift_rate': drift_rate,
                 'stability': stability,
-                'timeline': emotion_timeline[-10:] if emotion_timeline else []  # Last 10 windows
+                'timeline': timeline
             }
             
         except Exception as e:
-            logger.error(f"❌ Emotion calculation error: {str(e)}")
-            return self._default_emotions()
+            logger.error("❌ Emotion calculation error: %s", e)
+            return dict(_DEFAULT_EMOTIONS)
     
-    def _default_emotions(self) -> Dict[str, float]:
-        """Return default neutral emotions"""
-        return {
-            'valence': 0.0,
-            'arousal': 0.5,
-            'dominance': 0.5,
-            'drift_rate': 0.0,
-            'stability': 1.0
-        }
+    def _default_emotions(self) -> Mapping[str, float]:
+        """Return default neutral emotions (shared, read-only)"""
+        return _DEFAULT_EMOTIONS
+    
+    def _event_timestamp(self, event: Any) -> datetime:
+        """Get timestamp from event (handle different event types)"""
+        if hasattr(event, 'timestamp'):
+            return event.timestamp
+        elif isinstance(event, dict) and 'timestamp' in event:
+            return event['timestamp']
+        return datetime.utcnow()
     
     def _create_time_series(self, events: List[Any], window_seconds: int) -> Dict[datetime, List[Any]]:
-        """Group events into time windows"""
-        time_series = {}
+        """Group events into chronologically ordered time windows"""
+        if not events:
+            return {}
         
-        for event in events:
-            # Get timestamp from event (handle different event types)
-            if hasattr(event, 'timestamp'):
-                timestamp = event.timestamp
-            elif isinstance(event, dict) and 'timestamp' in event:
-                timestamp = event['timestamp']
-            else:
-                timestamp = datetime.utcnow()
-            
-            # Round timestamp to window boundary
-            window_start = timestamp.replace(
-                second=(timestamp.second // window_seconds) * window_seconds,
-                microsecond=0
-            )
-            
-            if window_start not in time_series:
-                time_series[window_start] = []
-            time_series[window_start].append(event)
+        timestamps = [self._event_timestamp(event) for event in events]
+        tzinfo = timestamps[0].tzinfo
+        epochs = np.fromiter(
+            (int(timestamp.timestamp()) for timestamp in timestamps),
+            dtype=np.int64,
+            count=len(timestamps)
+        )
+        buckets = epochs // window_seconds * window_seconds
+        
+        # Sort once by window, then slice the runs of equal windows
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        cuts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_buckets)) + 1, [len(buckets)])).tolist()
+        order = order.tolist()
+        
+        time_series = {}
+        for start, stop in zip(cuts[:-1], cuts[1:]):
+            window_start = datetime.fromtimestamp(int(sorted_buckets[start]), tzinfo)
+            time_series[window_start] = [events[j] for j in order[start:stop]]
         
         return time_series
     
+    def _event_marker(self, event: Any) -> tuple:
+        """Extract (marker_id, confidence) from an event object or dict"""
+        if hasattr(event, 'marker_id'):
+            return event.marker_id, getattr(event, 'confidence', 1.0)
+        elif isinstance(event, dict):
+            return event.get('marker_id', 'unknown'), event.get('confidence', 1.0)
+        return 'unknown', 1.0
+    
     def _calculate_window_emotions(self, events: List[Any]) -> Dict[str, float]:
         """Calculate emotions for events in a time window"""
-        if not events:
-            return {'valence': 0.0, 'arousal': 0.5, 'dominance': 0.5}
+        row = np.empty(3, dtype=np.float32)
+        self._window_vad(events, row)
+        return {
+            'valence': float(row[0]),
+            'arousal': float(row[1]),
+            'dominance': float(row[2])
+        }
+    
+    def _window_vad(self, events: List[Any], out: np.ndarray) -> None:
+        """Write the weighted (valence, arousal, dominance) of a window into out"""
+        # Collect table rows and weights of the mapped markers in one pass
+        lookup_row = self._lookup_row
+        indices = []
+        weights = []
+        for event in events:
+            marker_id, confidence = self._event_marker(event)
+            idx = lookup_row(marker_id)
+            if idx >= 0:
+                indices.append(idx)
+                weights.append(confidence)
         
-        total_valence = 0.0
-        total_arousal = 0.0
-        total_dominance = 0.0
-        total_weight = 0.0
+        if not indices:
+            out[:] = NEUTRAL_VAD
+            return
         
-        for event in events:
-            # Get marker ID from event
-            if hasattr(event, 'marker_id'):
-                marker_id = event.marker_id
-                confidence = getattr(event, 'confidence', 1.0)
-            elif isinstance(event, dict):
-                marker_id = event.get('marker_id', 'unknown')
-                confidence = event.get('confidence', 1.0)
-            else:
-                marker_id = 'unknown'
-                confidence = 1.0
-            
-            # Get emotion values for this marker
-            if marker_id in self.emotion_mappings:
-                emotions = self.emotion_mappings[marker_id]
-                weight = confidence
-                
-                total_valence += emotions['valence'] * weight
-                total_arousal += emotions['arousal'] * weight
-                total_dominance += emotions['dominance'] * weight
-                total_weight += weight
+        # A window made of one marker averages to that marker's own row
+        first_idx = indices[0]
+        if indices.count(first_idx) == len(indices):
+            out[:] = _VAD_TABLE[first_idx] if sum(weights) != 0 else NEUTRAL_VAD
+            return
         
-        if total_weight == 0:
-            return {'valence': 0.0, 'arousal': 0.5, 'dominance': 0.5}
+        w = np.asarray(weights, dtype=np.float32)
+        if _accumulate is not None and len(indices) >= NUMBA_MIN_EVENTS:
+            totals = _accumulate(np.asarray(indices, dtype=np.int32), w, _VAD_TABLE)
+            if totals[3] == 0:
+                out[:] = NEUTRAL_VAD
+            else:
+                out[:] = totals[:3] / totals[3]
+        elif w.sum() == 0:
+            out[:] = NEUTRAL_VAD
+        else:
+            out[:] = np.average(_VAD_TABLE[indices], axis=0, weights=w)
+    
+    def _summarize(self, vad: np.ndarray) -> tuple:
+        """Overall averages, drift rate and stability of a (T, 3) timeline in one pass"""
+        if not len(vad):
+            return {'valence': 0.0, 'arousal': 0.5, 'dominance': 0.5}, 0.0, 1.0
         
-        return {
-            'valence': total_valence / total_weight,
-            'arousal': total_arousal / total_weight,
-            'dominance': total_dominance / total_weight
+        valence, arousal, dominance = vad.mean(axis=0)
+        overall = {
+            'valence': float(valence),
+            'arousal': float(arousal),
+            'dominance': float(dominance)
         }
-    
-    def _calculate_overall_emotions(self, timeline: List[Dict]) -> Dict[str, float]:
-        """Calculate overall emotion averages"""
-        if not timeline:
-            return {'valence': 0.0, 'arousal': 0.5, 'dominance': 0.5}
+        if len(vad) < 2:
+            return overall, 0.0, 1.0
         
-        total_valence = sum(item['emotions']['valence'] for item in timeline)
-        total_arousal = sum(item['emotions']['arousal'] for item in timeline)
-        total_dominance = sum(item['emotions']['dominance'] for item in timeline)
-        count = len(timeline)
+        # Mean Euclidean distance between consecutive windows in emotion space
+        diffs = np.diff(vad, axis=0)
+        drift_rate = float(np.sqrt((diffs * diffs).sum(axis=1)).mean())
         
-        return {
-            'valence': total_valence / count,
-            'arousal': total_arousal / count,
-            'dominance': total_dominance / count
-        }
+        # Variance in valence (primary emotion dimension) mapped to a 0-1 scale
+        stability = max(0.0, 1.0 - float(vad[:, 0].var()))
+        return overall, drift_rate, stability
+    
+    def _calculate_overall_emotions(self, vad: np.ndarray) -> Dict[str, float]:
+        """Calculate overall emotion averages"""
+        return self._summarize(vad)[0]
     
-    def _calculate_drift_rate(self, timeline: List[Dict]) -> float:
+    def _calculate_drift_rate(self, vad: np.ndarray) -> float:
         """Calculate rate of emotional change"""
-        if len(timeline) < 2:
-            return 0.0
-        
-        total_change = 0.0
-        for i in range(1, len(timeline)):
-            prev_emotions = timeline[i-1]['emotions']
-            curr_emotions = timeline[i]['emotions']
-            
-            # Calculate Euclidean distance in emotion space
-            valence_diff = curr_emotions['valence'] - prev_emotions['valence']
-            arousal_diff = curr_emotions['arousal'] - prev_emotions['arousal']
-            dominance_diff = curr_emotions['dominance'] - prev_emotions['dominance']
-            
-            change = math.sqrt(valence_diff**2 + arousal_diff**2 + dominance_diff**2)
-            total_change += change
-        
-        return total_change / (len(timeline) - 1)
+        return self._summarize(vad)[1]
     
-    def _calculate_stability(self, timeline: List[Dict]) -> float:
+    def _calculate_stability(self, vad: np.ndarray) -> float:
         """Calculate emotional stability (1 - variance)"""
-        if len(timeline) < 2:
-            return 1.0
-        
-        # Calculate variance in valence (primary emotion dimension)
-        valences = [item['emotions']['valence'] for item in timeline]
-        mean_valence = sum(valences) / len(valences)
-        variance = sum((v - mean_valence)**2 for v in valences) / len(valences)
-        
-        # Convert variance to stability (0-1 scale)
-        stability = max(0.0, 1.0 - variance)
-        return stability
\ No newline at end of file
+        return self._summarize(vad)[2]
\ No newline at end of file
@@ -4,17 +4,32 @@ Processes WhatsApp exports, audio files, and text documents
 """
 
 from fastapi import UploadFile
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator, BinaryIO
 import asyncio
-import json
+import orjson
+import pandas as pd
 import zipfile
 import io
 import os
 from pathlib import Path
+from datetime import datetime, timezone
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Timestamp layout of WhatsApp chat exports, e.g. "01.01.20, 14:30:15"
+WHATSAPP_TIME_FORMAT = '%d.%m.%y, %H:%M:%S'
+
+# JSON uploads larger than this are parsed in a worker thread
+JSON_THREAD_THRESHOLD = 1_000_000
+
+# Leading marks some exports put before "[": a BOM on the first line, and
+# U+200E (left-to-right mark) on iOS media and system lines
+_LINE_MARKS = '\ufeff\u200e'
+
+# Placeholder transcript until an STT service is wired in
+_AUDIO_MESSAGES = ({'content': '[Audio transcription would go here]', 'timestamp': None, 'sender': 'audio'},)
+
 class FileProcessor:
     """Handles file upload and processing"""
     
@@ -30,30 +45,33 @@ class FileProcessor:
     async def process_file(self, file: UploadFile) -> Dict[str, Any]:
         """Process uploaded file based on content type"""
         try:
-            logger.info(f"📁 Processing file: {file.filename} ({file.content_type})")
+            logger.info("📁 Processing file: %s (%s)", file.filename, file.content_type)
             
-            # Read file content
-            content = await file.read()
-            
-            # Process based on content type
-            if file.content_type in self.supported_formats:
-                processor = self.supported_formats[file.content_type]
-                result = await processor(content, file.filename)
+            if file.content_type == 'application/zip':
+                # ZipFile seeks the spooled upload itself, so the archive is
+                # never copied into memory as a whole
+                result = await self._process_zip(file.file, file.filename)
+                size = file.size if file.size is not None else file.file.seek(0, os.SEEK_END)
             else:
-                # Try to process as text if unknown type
-                result = await self._process_text(content, file.filename)
+                # Read file content
+                content = await file.read()
+                size = len(content)
+                
+                # Process based on content type, try text if unknown type
+                processor = self.supported_formats.get(file.content_type, self._process_text)
+                result = await processor(content, file.filename)
             
             result['metadata'] = {
                 'filename': file.filename,
                 'content_type': file.content_type,
-                'size': len(content),
-                'processed_at': logger._formatTime(logger.handlers[0].formatter, logger.handlers[0].formatter.converter(asyncio.get_event_loop().time()))
+                'size': size,
+                'processed_at': datetime.now(timezone.utc).isoformat()
             }
             
             return result
             
         except Exception as e:
-            logger.error(f"❌ Error processing file {file.filename}: {str(e)}")
+            logger.error("❌ Error processing file %s: %s", file.filename, e)
             raise
     
     async def _process_text(self, content: bytes, filename: str) -> Dict[str, Any]:
@@ -72,37 +90,46 @@ class FileProcessor:
                 'messages': [{'content': 'Binary content converted to text', 'timestamp': None, 'sender': 'system'}]
             }
     
-    async def _process_zip(self, content: bytes, filename: str) -> Dict[str, Any]:
-        """Process ZIP file (WhatsApp export)"""
+    async def _process_zip(self, fileobj: BinaryIO, filename: str) -> Dict[str, Any]:
+        """Process ZIP file (WhatsApp export) from a seekable file object"""
         try:
-            with zipfile.ZipFile(io.BytesIO(content), 'r') as zip_file:
-                messages = []
-                
-                for file_info in zip_file.filelist:
-                    if file_info.filename.endswith('.txt'):
-                        # Process WhatsApp chat export
-                        with zip_file.open(file_info.filename) as chat_file:
-                            chat_content = chat_file.read().decode('utf-8')
-                            messages.extend(self._parse_whatsapp_export(chat_content))
-                
-                return {
-                    'type': 'whatsapp_export',
-                    'content': f"WhatsApp export with {len(messages)} messages",
-                    'messages': messages
-                }
+            # Decompression and parsing are blocking, keep them off the event loop
+            return await asyncio.to_thread(self._process_zip_sync, fileobj)
         except Exception as e:
-            logger.error(f"Error processing ZIP file: {e}")
-            return await self._process_text(content, filename)
+            logger.error("Error processing ZIP file: %s", e)
+            fileobj.seek(0)
+            return await self._process_text(fileobj.read(), filename)
+    
+    def _process_zip_sync(self, fileobj: BinaryIO) -> Dict[str, Any]:
+        """Extract and parse the chat files of a WhatsApp ZIP export"""
+        with zipfile.ZipFile(fileobj, 'r') as zip_file:
+            messages = []
+            
+            for file_info in zip_file.filelist:
+                if file_info.filename.endswith('.txt'):
+                    # Stream the WhatsApp chat export line by line
+                    with zip_file.open(file_info.filename) as raw:
+                        with io.TextIOWrapper(raw, encoding='utf-8', errors='replace', newline='') as chat_file:
+                            messages.extend(self._parse_whatsapp_lines(chat_file))
+            
+            self._attach_epochs(messages)
+            logger.info("📱 Parsed %d WhatsApp messages", len(messages))
+            return {
+                'type': 'whatsapp_export',
+                'content': f"WhatsApp export with {len(messages)} messages",
+                'messages': messages
+            }
     
     async def _process_audio(self, content: bytes, filename: str) -> Dict[str, Any]:
         """Process audio file (placeholder for STT)"""
         # This would integrate with Whisper or other STT service
+        size = len(content)
         return {
             'type': 'audio',
-            'content': f"Audio file: {filename} ({len(content)} bytes)",
-            'messages': [{'content': '[Audio transcription would go here]', 'timestamp': None, 'sender': 'audio'}],
+            'content': f"Audio file: {filename} ({size} bytes)",
+            'messages': list(_AUDIO_MESSAGES),
             'audio_metadata': {
-                'size': len(content),
+                'size': size,
                 'format': 'opus' if filename.endswith('.opus') else 'ogg'
             }
         }
@@ -110,51 +137,67 @@ class FileProcessor:
     async def _process_json(self, content: bytes, filename: str) -> Dict[str, Any]:
         """Process JSON file"""
         try:
-            data = json.loads(content.decode('utf-8'))
-            
-            if isinstance(data, list) and all('content' in item for item in data if isinstance(item, dict)):
-                # Looks like a message list
-                return {
-                    'type': 'json_messages',
-                    'content': f"JSON file with {len(data)} items",
-                    'messages': data
-                }
-            else:
-                return {
-                    'type': 'json_data',
-                    'content': json.dumps(data, indent=2),
-                    'messages': [{'content': json.dumps(data), 'timestamp': None, 'sender': 'json'}]
-                }
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON file: {e}")
+            if len(content) > JSON_THREAD_THRESHOLD:
+                return await asyncio.to_thread(self._process_json_sync, content)
+            return self._process_json_sync(content)
+        except orjson.JSONDecodeError as e:
+            logger.error("Invalid JSON file: %s", e)
             return await self._process_text(content, filename)
     
+    def _process_json_sync(self, content: bytes) -> Dict[str, Any]:
+        """Parse JSON content into messages or a pretty-printed document"""
+        data = orjson.loads(content)
+        
+        # Message lists are homogeneous, so the first item decides
+        if isinstance(data, list) and data and isinstance(data[0], dict) and 'content' in data[0]:
+            # Looks like a message list
+            return {
+                'type': 'json_messages',
+                'content': f"JSON file with {len(data)} items",
+                'messages': data
+            }
+        else:
+            return {
+                'type': 'json_data',
+                'content': orjson.dumps(data, option=orjson.OPT_INDENT_2).decode(),
+                'messages': [{'content': orjson.dumps(data).decode(), 'timestamp': None, 'sender': 'json'}]
+            }
+    
     def _parse_whatsapp_export(self, content: str) -> List[Dict[str, Any]]:
         """Parse WhatsApp chat export format"""
-        messages = []
-        lines = content.split('\n')
-        
+        messages = list(self._parse_whatsapp_lines(content.splitlines()))
+        self._attach_epochs(messages)
+        logger.info("📱 Parsed %d WhatsApp messages", len(messages))
+        return messages
+    
+    def _parse_whatsapp_lines(self, lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Yield messages from an iterable of WhatsApp export lines"""
         for line in lines:
-            line = line.strip()
-            if not line:
+            # "[timestamp] sender: message", located with two find() calls
+            line = line.strip().lstrip(_LINE_MARKS)
+            i = line.find('] ')
+            if i < 2 or line[0] != '[':
                 continue
-            
-            # Simple WhatsApp format parsing (can be enhanced)
-            if '] ' in line and ': ' in line:
-                try:
-                    timestamp_part, rest = line.split('] ', 1)
-                    timestamp = timestamp_part[1:]  # Remove leading [
-                    
-                    if ': ' in rest:
-                        sender, message = rest.split(': ', 1)
-                        messages.append({
-                            'timestamp': timestamp,
-                            'sender': sender,
-                            'content': message
-                        })
-                except ValueError:
-                    # Malformed line, skip
-                    continue
+            j = line.find(': ', i + 2)
+            if j < 0:
+                continue
+            yield {
+                'timestamp': line[1:i],
+                'sender': line[i + 2:j],
+                'content': line[j + 2:]
+            }
+    
+    def _attach_epochs(self, messages: List[Dict[str, Any]]) -> None:
+        """Add POSIX seconds ('epoch', None if unparseable) parsed in one batch"""
+        if not messages:
+            return
         
-        logger.info(f"📱 Parsed {len(messages)} WhatsApp messages")
-        return messages
\ No newline at end of file
+        parsed = pd.to_datetime(
+            [message['timestamp'] for message in messages],
+            format=WHATSAPP_TIME_FORMAT,
+            errors='coerce'
+        )
+        valid = (~parsed.isna()).tolist()
+        seconds = parsed.values.astype('datetime64[s]').view('int64').tolist()
+        for message, ok, epoch in zip(messages, valid, seconds):
+            message['epoch'] = epoch if ok else None
\ No newline at end of file
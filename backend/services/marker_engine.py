@@ -3,13 +3,23 @@
 Implements the four-tier Lean-Deep marker hierarchy (ATO→SEM→CLU→MEMA)
 """
 
+import os
 import re
+import sys
+import time
 import asyncio
-from typing import Dict, List, Any, Optional, AsyncGenerator
+import multiprocessing
+import bisect
+import operator
+from typing import Dict, List, Any, Optional, AsyncGenerator, Callable, Set
 from datetime import datetime
+import copy
 import hashlib
 import yaml
-from dataclasses import dataclass, asdict
+import numpy as np
+from collections import OrderedDict, Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 
 from .mongodb_service import MongoDBService
 from .nlp_service import NLPService
@@ -17,9 +27,50 @@ from .emotion_dynamics import EmotionDynamicsCalculator
 from utils.logger import setup_logger
 from utils.activation_dsl import ActivationDSLParser
 
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+try:
+    import ahocorasick
+except ImportError:  # Literal word markers stay in the combined regex
+    ahocorasick = None
+
 logger = setup_logger(__name__)
 
-@dataclass
+# Number of analysis results (and NLP results) kept per engine
+ANALYZE_CACHE_SIZE = 256
+
+# Comparison operators accepted in "PREFIX COUNT <op> N" rules
+COUNT_OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq
+}
+
+# Sentiment SEM marker (id, content) keyed by whether the score is positive
+SENTIMENT_MARKERS = {
+    True: ("S_PO_", "Positive sentiment"),
+    False: ("S_NE_", "Negative sentiment")
+}
+
+# Levels matched by pattern scanning and by activation rules
+SCAN_LEVELS = ("ATO", "SEM")
+RULE_LEVELS = ("CLU", "MEMA")
+
+# Characters of already streamed text re-scanned with each new chunk
+STREAM_SCAN_OVERLAP = 256
+
+# Marker patterns per combined alternation
+SCAN_GROUP_LIMIT = 100
+
+# Patterns that are just a word-bounded list of literals, e.g. \b(hello|hi|hey)\b
+LITERAL_WORDS_RE = re.compile(r"^\\b\((?:\?:)?(\w+(?:\|\w+)*)\)\\b$")
+
+@dataclass(slots=True)
 class MarkerDefinition:
     """Marker definition with four-letter prefix"""
     id: str  # Four-letter prefix (e.g., A_CO_, S_EM_, C_RE_, M_PS_)
@@ -32,17 +83,188 @@ class MarkerDefinition:
     context_required: bool = False
     dependencies: List[str] = None
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MarkerEvent:
-    """Detected marker event"""
+    """Detected marker event (immutable; hashable for set-based dedup)"""
     marker_id: str
     level: str
     timestamp: datetime
     position: int
     content: str
     confidence: float
-    context: Dict[str, Any] = None
-    metadata: Dict[str, Any] = None
+    # Dict payloads take part in equality but not in the hash
+    context: Dict[str, Any] = field(default=None, hash=False)
+    metadata: Dict[str, Any] = field(default=None, hash=False)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Shallow dict of the event (context/metadata are not copied)"""
+        return {
+            "marker_id": self.marker_id,
+            "level": self.level,
+            "timestamp": self.timestamp,
+            "position": self.position,
+            "content": self.content,
+            "confidence": self.confidence,
+            "context": self.context,
+            "metadata": self.metadata
+        }
+
+def _is_word_char(char: str) -> bool:
+    """Whether char counts as a word character for regex word boundaries"""
+    return char.isalnum() or char == "_"
+
+def _flatten_groups(items):
+    """Parsed regex items with plain (flag-free) groups inlined"""
+    for op, arg in items:
+        if op is sre_parse.SUBPATTERN and not arg[1] and not arg[2]:
+            yield from _flatten_groups(arg[3])
+        else:
+            yield op, arg
+
+def _has_backref(node) -> bool:
+    """Whether a parsed pattern refers back to one of its own groups"""
+    if isinstance(node, sre_parse.SubPattern):
+        node = node.data
+    if isinstance(node, (list, tuple)):
+        if len(node) == 2 and (node[0] is sre_parse.GROUPREF or node[0] is sre_parse.GROUPREF_EXISTS):
+            return True
+        return any(_has_backref(child) for child in node)
+    return False
+
+def _embeddable(pattern: str) -> bool:
+    """Whether a pattern can be one branch of a combined prefilter"""
+    try:
+        parsed = sre_parse.parse(pattern)
+        # Global inline flags are only valid at the start of a whole pattern
+        re.compile(f"(?:{pattern})")
+    except re.error:
+        return False
+    # Group numbers shift inside the combined pattern
+    return not _has_backref(parsed)
+
+def _required_literal(pattern: str) -> Optional[str]:
+    """Longest literal run, lowercased, that every match of a pattern contains"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    
+    best = current = ""
+    for op, arg in _flatten_groups(parsed):
+        if op is sre_parse.LITERAL:
+            current += chr(arg)
+            if len(current) > len(best):
+                best = current
+        else:
+            current = ""
+    return best.lower() or None
+
+# Integer codes of the marker levels, used by EventStore columns
+LEVEL_CODES = {"ATO": 1, "SEM": 2, "CLU": 3, "MEMA": 4}
+
+# Out-of-order tail sizes up to this are merged into the timeline by bisection
+TIMELINE_MERGE_LIMIT = 64
+
+class EventStore:
+    """Column-wise (struct-of-arrays) view of marker events for aggregation"""
+    
+    __slots__ = ("events", "marker_ids", "levels", "positions")
+    
+    def __init__(self, events: List[MarkerEvent]):
+        count = len(events)
+        self.events = events
+        self.marker_ids = [e.marker_id for e in events]
+        self.levels = np.fromiter((LEVEL_CODES.get(e.level, 0) for e in events), dtype=np.int8, count=count)
+        self.positions = np.fromiter((e.position for e in events), dtype=np.int64, count=count)
+    
+    def level_counts(self) -> Dict[str, int]:
+        """Events per level, always including the four standard levels"""
+        bins = np.bincount(self.levels, minlength=len(LEVEL_CODES) + 1)
+        counts = {level: int(bins[code]) for level, code in LEVEL_CODES.items()}
+        if bins[0]:
+            # Levels outside the hierarchy are counted by name
+            for event in self.events:
+                if event.level not in LEVEL_CODES:
+                    counts[event.level] = counts.get(event.level, 0) + 1
+        return counts
+    
+    def position_order(self) -> List[int]:
+        """Event indices sorted by position (stable)"""
+        positions = self.positions
+        count = positions.size
+        descents = np.flatnonzero(positions[1:] < positions[:-1])
+        if not descents.size:
+            # Scan hits already arrive left to right
+            return list(range(count))
+        
+        head = int(descents[0]) + 1
+        if count - head > TIMELINE_MERGE_LIMIT:
+            return np.argsort(positions, kind="stable").tolist()
+        
+        # Merge the few appended rule/emotion events into the sorted head
+        order = list(range(head))
+        keys = positions[:head].tolist()
+        for index in range(head, count):
+            position = int(positions[index])
+            slot = bisect.bisect_right(keys, position)
+            keys.insert(slot, position)
+            order.insert(slot, index)
+        return order
+
+_HIT_START = operator.itemgetter(1)
+
+# Content longer than this is scanned in a worker process
+SCAN_PROCESS_THRESHOLD = 50_000
+
+_scan_pool: Optional[ProcessPoolExecutor] = None
+# Index key of the marker set the scan pool's workers were loaded with
+_scan_pool_key: Optional[tuple] = None
+
+# Set in analysis pool workers, which already run one per core
+_in_pool_worker = False
+
+def mark_pool_worker():
+    """Scan large documents in-process instead of opening a nested scan pool"""
+    global _in_pool_worker
+    _in_pool_worker = True
+
+def get_scan_pool(engine: "MarkerEngine") -> ProcessPoolExecutor:
+    """Process pool for scanning large documents with the engine's current markers"""
+    global _scan_pool, _scan_pool_key
+    if _scan_pool is None or _scan_pool_key != engine._index_key:
+        shutdown_scan_pool()
+        # Spawned, not forked: the server process runs threads and an event loop
+        _scan_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_scan_worker,
+            initargs=(engine._scan_markers(),)
+        )
+        _scan_pool_key = engine._index_key
+    return _scan_pool
+
+def shutdown_scan_pool():
+    """Stop the scan pool's workers, if it was started"""
+    global _scan_pool, _scan_pool_key
+    if _scan_pool is not None:
+        # Scans already submitted still finish
+        _scan_pool.shutdown(wait=False)
+        _scan_pool = None
+        _scan_pool_key = None
+
+# Per-worker engine holding the markers the pool was created with
+_worker_scanner: Optional["MarkerEngine"] = None
+
+def _init_scan_worker(markers: tuple):
+    """Build the scan index of a new pool worker once"""
+    global _worker_scanner
+    _worker_scanner = MarkerEngine(None)
+    _worker_scanner.markers = {marker.id: marker for marker in markers}
+    _worker_scanner._ensure_index()
+
+def _scan_worker(content: str) -> List[tuple]:
+    """Scan content in a pool worker, returning (marker_id, start, end) hits"""
+    return [(marker.id, start, end) for marker, start, end in _worker_scanner._scan_hits(content)]
 
 class MarkerEngine:
     """
@@ -66,49 +288,177 @@ class MarkerEngine:
             "MEMA": 4  # Meta-Marker
         }
         
+        # Prefiltered per-level pattern groups, rebuilt whenever self.markers changes
+        self._index_key = None
+        self._level_scanners = []
+        self._literal_automaton = None
+        self._literal_fallback = []
+        self._markers_by_level: Dict[str, List[MarkerDefinition]] = {}
+        
+        # Activation rules compiled to predicates, keyed by rule text
+        self._rule_fns: Dict[str, Callable] = {}
+        self._count_prefixes = set()
+        # (marker, predicate) for every CLU/MEMA marker with a usable rule
+        self._rule_markers: List[tuple] = []
+        
+        # LRU caches keyed by content hash
+        self._analyze_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._nlp_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
     async def initialize(self):
         """Initialize marker engine and load definitions"""
         try:
             logger.info("🚀 Initializing Marker Engine...")
             
-            # Load marker definitions from database
+            # Load marker definitions from database (also builds the scan index)
             await self.load_markers()
             
-            # Initialize NLP service
-            await self.nlp.initialize()
-            
-            # Initialize emotion dynamics
-            self.emotion_calc.initialize()
-            
             self.is_initialized = True
             logger.info(f"✅ Marker Engine initialized with {len(self.markers)} markers")
-            
+        
         except Exception as e:
             logger.error(f"❌ Failed to initialize Marker Engine: {str(e)}")
             raise
     
+    def _ensure_index(self):
+        """Rebuild the derived scan structures if the marker set changed"""
+        key = tuple(map(id, self.markers.values()))
+        if key != self._index_key:
+            self._build_scan_index()
+            self._index_key = key
+            # Cached results were produced with the old marker set
+            self._analyze_cache.clear()
+    
+    def _build_scan_index(self):
+        """Group ATO/SEM patterns per level behind combined prefilters and collect CLU/MEMA rules"""
+        self._level_scanners = []
+        self._literal_automaton = None
+        self._literal_fallback = []
+        literal_words = []
+        solo_members = []
+        
+        by_level = defaultdict(list)
+        for marker in self.markers.values():
+            by_level[marker.level].append(marker)
+        self._markers_by_level = dict(by_level)
+        
+        self._rule_markers = []
+        for marker in self._markers_of(RULE_LEVELS):
+            if marker.activation_rule:
+                rule_fn = self._get_rule_fn(marker.activation_rule)
+                if rule_fn is not None:
+                    self._rule_markers.append((marker, rule_fn))
+        
+        for level in SCAN_LEVELS:
+            grouped_members = []
+            for marker in self._markers_by_level.get(level, ()):
+                if not marker.pattern:
+                    continue
+                
+                # Plain keyword lists go to the Aho-Corasick automaton
+                literal = LITERAL_WORDS_RE.match(marker.pattern) if ahocorasick else None
+                if literal:
+                    literal_words.extend((word.lower(), marker) for word in literal.group(1).split("|"))
+                    continue
+                
+                try:
+                    regex = re.compile(marker.pattern, re.IGNORECASE)
+                except re.error as e:
+                    logger.error(f"❌ Invalid pattern for marker {marker.id}: {e}")
+                    continue
+                anchor = _required_literal(marker.pattern)
+                # Case-folded matches of a non-ASCII literal need not contain it
+                member = (marker, regex, anchor if anchor and anchor.isascii() else None)
+                if _embeddable(marker.pattern):
+                    grouped_members.append(member)
+                else:
+                    solo_members.append(member)
+            
+            # Bounded alternations keep each compiled prefilter small
+            for start in range(0, len(grouped_members), SCAN_GROUP_LIMIT):
+                members = grouped_members[start:start + SCAN_GROUP_LIMIT]
+                self._level_scanners.append((self._prefilter(members), tuple(members)))
+        
+        if solo_members:
+            self._level_scanners.append((None, tuple(solo_members)))
+        
+        if literal_words:
+            # A keyword may belong to several markers
+            word_markers = {}
+            for word, marker in literal_words:
+                word_markers.setdefault(word, []).append(marker)
+            
+            automaton = ahocorasick.Automaton()
+            for word, markers in word_markers.items():
+                automaton.add_word(word, (word, tuple(markers)))
+            automaton.make_automaton()
+            self._literal_automaton = automaton
+            self._literal_fallback = [
+                (re.compile(rf"\b{re.escape(word)}\b", re.IGNORECASE), tuple(markers))
+                for word, markers in word_markers.items()
+            ]
+    
+    @staticmethod
+    def _prefilter(members: List[tuple]) -> Optional[re.Pattern]:
+        """Alternation of the members' patterns, finding where the first of them matches"""
+        if len(members) < 2:
+            return None
+        try:
+            return re.compile("|".join(f"(?:{marker.pattern})" for marker, _, _ in members), re.IGNORECASE)
+        except re.error:
+            # e.g. the same group name in two patterns
+            return None
+    
+    def _scan_literals(self, content: str, lowered: Optional[str], start: int, end: int):
+        """Yield (marker, start, end) for whole-word keyword hits in content[start:end]"""
+        if lowered is None:
+            # Case mapping changed the length, offsets would not line up
+            for pattern, markers in self._literal_fallback:
+                for match in pattern.finditer(content, start, end):
+                    for marker in markers:
+                        yield marker, match.start(), match.end()
+            return
+        
+        length = len(content)
+        for last, (word, markers) in self._literal_automaton.iter(lowered, start, end):
+            word_start = last - len(word) + 1
+            word_end = last + 1
+            # Emulate \b on both sides of the keyword
+            if word_start > 0 and _is_word_char(lowered[word_start - 1]):
+                continue
+            if word_end < length and _is_word_char(lowered[word_end]):
+                continue
+            for marker in markers:
+                yield marker, word_start, word_end
+    
     async def load_markers(self):
         """Load marker definitions from MongoDB"""
         try:
             # Get all marker definitions
             markers_data = await self.db.get_markers({})
             
-            for marker_data in markers_data:
-                marker = MarkerDefinition(
-                    id=marker_data["id"],
-                    level=marker_data["level"],
-                    category=marker_data["category"],
-                    pattern=marker_data["pattern"],
-                    description=marker_data.get("description", ""),
-                    weight=marker_data.get("weight", 1.0),
-                    activation_rule=marker_data.get("activation_rule"),
-                    context_required=marker_data.get("context_required", False),
-                    dependencies=marker_data.get("dependencies", [])
+            # Interned ids and levels compare by identity in sets and dicts
+            intern = sys.intern
+            make = MarkerDefinition
+            self.markers.update({
+                intern(d["id"]): make(
+                    intern(d["id"]),
+                    intern(d["level"]),
+                    d["category"],
+                    d["pattern"],
+                    d.get("description", ""),
+                    d.get("weight", 1.0),
+                    d.get("activation_rule"),
+                    d.get("context_required", False),
+                    d.get("dependencies") or []
                 )
-                self.markers[marker.id] = marker
-                
-            logger.info(f"📚 Loaded {len(self.markers)} marker definitions")
+                for d in markers_data
+            })
             
+            # Compile the scanners now rather than on the first request
+            self._ensure_index()
+            logger.info(f"📚 Loaded {len(self.markers)} marker definitions")
+        
         except Exception as e:
             logger.error(f"❌ Error loading markers: {str(e)}")
             # Load default markers if database is empty
@@ -138,7 +488,8 @@ class MarkerEngine:
         
         for marker in default_markers:
             self.markers[marker.id] = marker
-            
+        
+        self._ensure_index()
         logger.info(f"📝 Loaded {len(default_markers)} default markers")
     
     async def analyze(
@@ -150,12 +501,25 @@ class MarkerEngine:
         """
         Analyze content through the four-tier marker hierarchy
         """
+        started = time.perf_counter()
         try:
-            logger.info("🔍 Starting marker analysis...")
+            logger.debug("🔍 Starting marker analysis...")
+            
+            # Repeated content (e.g. streamed prefixes) reuses earlier results
+            self._ensure_index()
+            content_key = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+            cache_key = content_key
+            if context or options:
+                cache_key += hashlib.blake2b(repr((context, options)).encode(), digest_size=8).hexdigest()
+            cached = self._analyze_cache.get(cache_key)
+            if cached is not None:
+                self._analyze_cache.move_to_end(cache_key)
+                return copy.deepcopy(cached)
             
             # Initialize analysis context
             analysis_context = {
                 "content": content,
+                "content_key": content_key,
                 "timestamp": datetime.utcnow(),
                 "context": context or {},
                 "options": options or {},
@@ -165,11 +529,14 @@ class MarkerEngine:
                 "profile": {}
             }
             
-            # Step 1: Initial scan (ATO + simple SEM)
-            await self.initial_scan(analysis_context)
-            
-            # Step 2: NLP enrichment
-            await self.nlp_enrichment(analysis_context)
+            # Steps 1 + 2: Initial scan (ATO + simple SEM) and NLP enrichment
+            # only read the content, so they run concurrently
+            scan_events, nlp_events = await asyncio.gather(
+                self.initial_scan(analysis_context),
+                self.nlp_enrichment(analysis_context)
+            )
+            analysis_context["events"].extend(scan_events)
+            analysis_context["events"].extend(nlp_events)
             
             # Step 3: Contextual re-scan (CLU + MEMA)
             await self.contextual_rescan(analysis_context)
@@ -177,184 +544,302 @@ class MarkerEngine:
             # Step 4: Emotion dynamics calculation
             await self.calculate_emotions(analysis_context)
             
+            # One pass of event aggregates shared by the profile and the metadata
+            analysis_context["_aggregates"] = self._aggregate_events(analysis_context["events"])
+            
             # Step 5: Generate profile
             await self.generate_profile(analysis_context)
             
             # Prepare response
             result = {
-                "markers": [asdict(event) for event in analysis_context["events"]],
+                "markers": [event.to_dict() for event in analysis_context["events"]],
                 "emotions": analysis_context["emotions"],
-                "timeline": self.create_timeline(analysis_context["events"]),
+                "timeline": self.create_timeline(
+                    analysis_context["events"], analysis_context["_aggregates"]["store"]
+                ),
                 "profile": analysis_context["profile"],
                 "metadata": {
                     "total_markers": len(analysis_context["events"]),
-                    "levels": self.count_by_level(analysis_context["events"]),
-                    "processing_time": (datetime.utcnow() - analysis_context["timestamp"]).total_seconds()
+                    "levels": dict(analysis_context["_aggregates"]["by_level"]),
+                    "processing_time": time.perf_counter() - started
                 }
             }
             
-            logger.info(f"✅ Analysis complete: {result['metadata']['total_markers']} markers detected")
-            return result
+            self._cache_put(self._analyze_cache, cache_key, copy.deepcopy(result))
             
+            logger.info(
+                "✅ Analysis complete: %d markers detected in %.1f ms",
+                result["metadata"]["total_markers"], result["metadata"]["processing_time"] * 1000
+            )
+            return result
+        
         except Exception as e:
             logger.error(f"❌ Analysis error: {str(e)}")
             raise
     
-    async def initial_scan(self, context: Dict[str, Any]):
+    async def initial_scan(self, context: Dict[str, Any]) -> List[MarkerEvent]:
         """Step 1: Initial pattern matching for ATO and simple SEM markers"""
+        self._ensure_index()
+        
         content = context["content"]
-        events = []
+        if len(content) > SCAN_PROCESS_THRESHOLD and not _in_pool_worker:
+            # Large documents are scanned on another core
+            loop = asyncio.get_running_loop()
+            raw_hits = await loop.run_in_executor(get_scan_pool(self), _scan_worker, content)
+            events = [
+                self._make_event(self.markers[marker_id], context["timestamp"], content, start, end)
+                for marker_id, start, end in raw_hits
+            ]
+        else:
+            # Regex scanning is CPU-bound, keep it off the event loop
+            events = await asyncio.to_thread(self._scan_events, content, context["timestamp"])
         
-        for marker_id, marker in self.markers.items():
-            if marker.level not in ["ATO", "SEM"]:
-                continue
-                
-            if marker.pattern:
-                # Pattern-based matching
-                matches = re.finditer(marker.pattern, content, re.IGNORECASE)
-                for match in matches:
-                    event = MarkerEvent(
-                        marker_id=marker.id,
-                        level=marker.level,
-                        timestamp=context["timestamp"],
-                        position=match.start(),
-                        content=match.group(0),
-                        confidence=0.9 if marker.level == "ATO" else 0.8,
-                        context={"match": match.group(0)},
-                        metadata={"category": marker.category}
-                    )
-                    events.append(event)
+        logger.debug("📍 Initial scan: %d ATO/SEM markers detected", len(events))
+        return events
+    
+    def _markers_of(self, levels: tuple) -> List[MarkerDefinition]:
+        """Loaded markers of the given levels, from the per-level partition"""
+        return [marker for level in levels for marker in self._markers_by_level.get(level, ())]
+    
+    def _scan_markers(self) -> tuple:
+        """The ATO/SEM markers a scan worker needs"""
+        return tuple(self._markers_of(SCAN_LEVELS))
+    
+    def _scan_events(
+        self,
+        content: str,
+        timestamp: datetime,
+        start: int = 0,
+        end: Optional[int] = None,
+        lowered: Optional[str] = None
+    ) -> List[MarkerEvent]:
+        """Match all ATO/SEM markers in content[start:end]"""
+        make_event = self._make_event
+        return [
+            make_event(marker, timestamp, content, match_start, match_end)
+            for marker, match_start, match_end in self._scan_hits(content, start, end, lowered)
+        ]
+    
+    @staticmethod
+    def _make_event(
+        marker: MarkerDefinition,
+        timestamp: datetime,
+        content: str,
+        start: int,
+        end: int
+    ) -> MarkerEvent:
+        """Build the event for a pattern hit at content[start:end]"""
+        text = content[start:end]
+        # Positional construction skips keyword argument matching per event
+        return MarkerEvent(
+            marker.id,
+            marker.level,
+            timestamp,
+            start,
+            text,
+            0.9 if marker.level == "ATO" else 0.8,
+            {"match": text},
+            {"category": marker.category}
+        )
+    
+    def _scan_hits(
+        self,
+        content: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        lowered: Optional[str] = None
+    ) -> List[tuple]:
+        """(marker, start, end) of every ATO/SEM pattern hit in content[start:end]"""
+        hits = []
+        if end is None:
+            end = len(content)
         
-        context["events"].extend(events)
-        logger.info(f"📍 Initial scan: {len(events)} ATO/SEM markers detected")
+        # Lowercase once per content; unusable if case mapping changes length
+        if lowered is None:
+            lowered = content.lower()
+        if len(lowered) != len(content):
+            lowered = None
+        
+        # Literal anchors are only checked where case folding maps ASCII to ASCII
+        anchored = lowered is not None and content.isascii()
+        
+        # Every pattern runs on its own, so overlapping hits of different markers
+        # are all kept; the prefilter finds where a group's first hit can start
+        for prefilter, members in self._level_scanners:
+            scan_from = start
+            if prefilter is not None:
+                first = prefilter.search(content, start, end)
+                if first is None:
+                    continue
+                scan_from = first.start()
+            
+            for marker, regex, anchor in members:
+                if anchored and anchor is not None and lowered.find(anchor, scan_from, end) < 0:
+                    continue
+                for match in regex.finditer(content, scan_from, end):
+                    hits.append((marker, match.start(), match.end()))
+        
+        if self._literal_automaton is not None:
+            hits.extend(self._scan_literals(content, lowered, start, end))
+        
+        # Each scanner yields left to right, so this only merges sorted runs
+        hits.sort(key=_HIT_START)
+        return hits
     
-    async def nlp_enrichment(self, context: Dict[str, Any]):
+    async def nlp_enrichment(self, context: Dict[str, Any]) -> List[MarkerEvent]:
         """Step 2: Enrich with Spark NLP analysis"""
         try:
             content = context["content"]
             
-            # Run NLP analysis
-            nlp_result = await self.nlp.analyze(content)
+            # Run NLP analysis, once per distinct content
+            content_key = context.get("content_key")
+            nlp_result = self._nlp_cache.get(content_key) if content_key else None
+            if nlp_result is None:
+                nlp_result = await self.nlp.analyze(content)
+                if content_key:
+                    self._cache_put(self._nlp_cache, content_key, nlp_result)
             
             context["nlp_enrichment"] = nlp_result
             
             # Create SEM markers from NLP results
             events = []
+            timestamp = context["timestamp"]
             
             # Sentiment markers
             if nlp_result.get("sentiment"):
                 sentiment = nlp_result["sentiment"]
-                if sentiment["score"] > 0.7:
-                    events.append(MarkerEvent(
-                        marker_id="S_PO_",
-                        level="SEM",
-                        timestamp=context["timestamp"],
-                        position=0,
-                        content="Positive sentiment",
-                        confidence=sentiment["score"],
-                        metadata={"sentiment": sentiment}
-                    ))
-                elif sentiment["score"] < -0.7:
+                score = sentiment["score"]
+                if abs(score) > 0.7:
+                    marker_id, label = SENTIMENT_MARKERS[score > 0]
                     events.append(MarkerEvent(
-                        marker_id="S_NE_",
-                        level="SEM",
-                        timestamp=context["timestamp"],
-                        position=0,
-                        content="Negative sentiment",
-                        confidence=abs(sentiment["score"]),
-                        metadata={"sentiment": sentiment}
+                        marker_id, "SEM", timestamp, 0, label, abs(score), None, {"sentiment": sentiment}
                     ))
             
             # Entity markers
             for entity in nlp_result.get("entities", []):
                 events.append(MarkerEvent(
-                    marker_id=f"S_EN_{entity['type'][:2].upper()}_",
-                    level="SEM",
-                    timestamp=context["timestamp"],
-                    position=entity.get("position", 0),
-                    content=entity["text"],
-                    confidence=entity.get("confidence", 0.8),
-                    metadata={"entity": entity}
+                    sys.intern(f"S_EN_{entity['type'][:2].upper()}_"),
+                    "SEM",
+                    timestamp,
+                    entity.get("position", 0),
+                    entity["text"],
+                    entity.get("confidence", 0.8),
+                    None,
+                    {"entity": entity}
                 ))
             
-            context["events"].extend(events)
-            logger.info(f"🧠 NLP enrichment: {len(events)} additional markers")
-            
+            logger.debug("🧠 NLP enrichment: %d additional markers", len(events))
+            return events
+        
         except Exception as e:
             logger.error(f"❌ NLP enrichment error: {str(e)}")
+            return []
     
     async def contextual_rescan(self, context: Dict[str, Any]):
         """Step 3: Activate CLU and MEMA markers based on activation rules"""
         events = []
-        existing_markers = {e.marker_id for e in context["events"]}
         
-        for marker_id, marker in self.markers.items():
-            if marker.level not in ["CLU", "MEMA"]:
-                continue
-                
-            if marker.activation_rule:
-                # Evaluate activation rule
-                if self.evaluate_activation_rule(marker.activation_rule, context):
-                    event = MarkerEvent(
-                        marker_id=marker.id,
-                        level=marker.level,
-                        timestamp=context["timestamp"],
-                        position=0,
-                        content=f"Activated: {marker.description}",
-                        confidence=0.85,
-                        metadata={
-                            "activation_rule": marker.activation_rule,
-                            "triggered_by": list(existing_markers)
-                        }
-                    )
-                    events.append(event)
+        self._ensure_index()
+        
+        # Marker ids and COUNT prefix totals are computed once for all rules
+        existing_markers, prefix_counts = self._rule_inputs(context["events"])
+        emotions = context.get("emotions")
+        
+        for marker, rule_fn in self._rule_markers:
+            # Evaluate activation rule
+            if self._apply_rule(rule_fn, existing_markers, prefix_counts, emotions):
+                event = MarkerEvent(
+                    marker_id=marker.id,
+                    level=marker.level,
+                    timestamp=context["timestamp"],
+                    position=0,
+                    content=f"Activated: {marker.description}",
+                    confidence=0.85,
+                    metadata={
+                        "activation_rule": marker.activation_rule,
+                        "triggered_by": list(existing_markers)
+                    }
+                )
+                events.append(event)
         
         context["events"].extend(events)
-        logger.info(f"🔄 Contextual rescan: {len(events)} CLU/MEMA markers activated")
+        logger.debug("🔄 Contextual rescan: %d CLU/MEMA markers activated", len(events))
     
-    def evaluate_activation_rule(self, rule: str, context: Dict[str, Any]) -> bool:
-        """Evaluate DSL activation rules"""
+    def evaluate_activation_rule(
+        self,
+        rule: str,
+        context: Dict[str, Any],
+        existing_id_set: Optional[Set[str]] = None
+    ) -> bool:
+        """Evaluate DSL activation rules, optionally against precomputed marker ids"""
+        rule_fn = self._get_rule_fn(rule)
+        if rule_fn is None:
+            return False
         try:
-            # Parse and evaluate the rule
-            existing_markers = [e.marker_id for e in context["events"]]
-            
-            # Simple rule evaluation (to be enhanced with PEG.js parser)
-            if "AND" in rule:
-                required = rule.split(" AND ")
-                return all(r.strip() in existing_markers for r in required)
-            elif "OR" in rule:
-                options = rule.split(" OR ")
-                return any(o.strip() in existing_markers for o in options)
-            elif "COUNT" in rule:
-                # Parse count rules like "A_EM_ COUNT > 3"
-                parts = rule.split()
-                if len(parts) >= 4:
-                    marker_prefix = parts[0]
-                    operator = parts[2]
-                    threshold = int(parts[3])
-                    count = sum(1 for e in context["events"] if e.marker_id.startswith(marker_prefix))
-                    
-                    if operator == ">":
-                        return count > threshold
-                    elif operator == ">=":
-                        return count >= threshold
-                    elif operator == "<":
-                        return count < threshold
-                    elif operator == "<=":
-                        return count <= threshold
-                    elif operator == "==":
-                        return count == threshold
-            elif "DRIFT_HIGH" in rule:
-                # Check emotion drift
-                emotions = context.get("emotions", {})
-                return emotions.get("drift_level") == "high"
-            
-            # Default: check if marker exists
-            return rule in existing_markers
-            
+            if existing_id_set is None:
+                existing_markers, prefix_counts = self._rule_inputs(context["events"])
+            else:
+                existing_markers = existing_id_set
+                # COUNT rules still need per-prefix totals from the events
+                prefix_counts = self._rule_inputs(context["events"])[1] if self._count_prefixes else {}
         except Exception as e:
             logger.error(f"Rule evaluation error: {str(e)}")
             return False
+        return self._apply_rule(rule_fn, existing_markers, prefix_counts, context.get("emotions"))
+    
+    def _get_rule_fn(self, rule: str) -> Optional[Callable]:
+        """Compiled predicate for a rule, None if it cannot be parsed"""
+        rule_fn = self._rule_fns.get(rule)
+        if rule_fn is None:
+            try:
+                rule_fn = self._rule_fns[rule] = self._compile_rule(rule)
+            except Exception as e:
+                logger.error(f"Rule evaluation error: {str(e)}")
+                return None
+        return rule_fn
+    
+    def _rule_inputs(self, events: List[MarkerEvent]) -> tuple:
+        """Set of present marker ids and event counts per COUNT rule prefix"""
+        id_counts = Counter(e.marker_id for e in events)
+        prefix_counts = {
+            prefix: sum(n for marker_id, n in id_counts.items() if marker_id.startswith(prefix))
+            for prefix in self._count_prefixes
+        }
+        return id_counts.keys(), prefix_counts
+    
+    def _apply_rule(self, rule_fn: Callable, existing_markers, prefix_counts: Dict[str, int], emotions) -> bool:
+        """Run a compiled rule, treating evaluation errors as not activated"""
+        try:
+            return rule_fn(existing_markers, prefix_counts, emotions)
+        except Exception as e:
+            logger.error(f"Rule evaluation error: {str(e)}")
+            return False
+    
+    def _compile_rule(self, rule: str) -> Callable:
+        """Parse a rule once into a predicate over (marker ids, prefix counts, emotions)"""
+        # Simple rule evaluation (to be enhanced with PEG.js parser)
+        if "AND" in rule:
+            required = tuple(sys.intern(r.strip()) for r in rule.split(" AND "))
+            return lambda ids, counts, emotions: all(r in ids for r in required)
+        elif "OR" in rule:
+            options = tuple(sys.intern(o.strip()) for o in rule.split(" OR "))
+            return lambda ids, counts, emotions: any(o in ids for o in options)
+        elif "COUNT" in rule:
+            # Parse count rules like "A_EM_ COUNT > 3"
+            parts = rule.split()
+            if len(parts) >= 4:
+                marker_prefix = parts[0]
+                threshold = int(parts[3])
+                compare = COUNT_OPERATORS.get(parts[2])
+                if compare is not None:
+                    self._count_prefixes.add(marker_prefix)
+                    return lambda ids, counts, emotions: compare(counts.get(marker_prefix, 0), threshold)
+        elif "DRIFT_HIGH" in rule:
+            # Check emotion drift
+            return lambda ids, counts, emotions: (emotions or {}).get("drift_level") == "high"
+        
+        # Default: check if marker exists
+        return lambda ids, counts, emotions: rule in ids
     
     async def calculate_emotions(self, context: Dict[str, Any]):
         """Step 4: Calculate EmotionDynamics metrics"""
@@ -386,9 +871,9 @@ class MarkerEngine:
                     metadata={"emotions": emotions}
                 )
                 context["events"].append(drift_marker)
-                
-            logger.info(f"😊 Emotion dynamics calculated: {emotions.get('home_base', 0):.2f} base")
             
+            logger.debug("😊 Emotion dynamics calculated: %.2f base", emotions.get("home_base", 0))
+        
         except Exception as e:
             logger.error(f"❌ Emotion calculation error: {str(e)}")
             context["emotions"] = {}
@@ -396,21 +881,27 @@ class MarkerEngine:
     async def generate_profile(self, context: Dict[str, Any]):
         """Step 5: Generate dynamic profile based on markers"""
         try:
+            events = context["events"]
+            aggregates = context.get("_aggregates")
+            if aggregates is None:
+                aggregates = context["_aggregates"] = self._aggregate_events(events)
+            risks = self.identify_risks(context)
+            
             profile = {
                 "timestamp": context["timestamp"].isoformat(),
                 "summary": {
-                    "total_markers": len(context["events"]),
-                    "dominant_level": self.get_dominant_level(context["events"]),
-                    "key_patterns": self.extract_key_patterns(context["events"])
+                    "total_markers": len(events),
+                    "dominant_level": self.get_dominant_level(events, aggregates["by_level"]),
+                    "key_patterns": self.extract_key_patterns(events, aggregates["by_category"])
                 },
                 "characteristics": self.extract_characteristics(context),
-                "risk_indicators": self.identify_risks(context),
-                "recommendations": self.generate_recommendations(context)
+                "risk_indicators": risks,
+                "recommendations": self.generate_recommendations(context, risks)
             }
             
             context["profile"] = profile
-            logger.info("📋 Profile generated successfully")
-            
+            logger.debug("📋 Profile generated successfully")
+        
         except Exception as e:
             logger.error(f"❌ Profile generation error: {str(e)}")
             context["profile"] = {}
@@ -418,22 +909,46 @@ class MarkerEngine:
     async def analyze_stream(self, content: str) -> AsyncGenerator[Dict[str, Any], None]:
         """Stream analysis results in real-time"""
         try:
+            self._ensure_index()
+            
             # Split content into chunks for streaming
             chunks = content.split("\n")
-            accumulated_content = ""
+            lowered = content.lower()
+            stream_events: List[MarkerEvent] = []
+            seen = set()
+            offset = 0
             
             for chunk in chunks:
-                accumulated_content += chunk + "\n"
+                timestamp = datetime.utcnow()
+                chunk_end = min(offset + len(chunk) + 1, len(content))
                 
-                # Analyze current accumulated content
-                result = await self.analyze(accumulated_content)
+                # Only the new chunk is scanned, plus enough of the previous
+                # text to catch matches that straddle the chunk boundary
+                window_start = max(0, offset - STREAM_SCAN_OVERLAP)
+                for event in self._scan_events(content, timestamp, window_start, chunk_end, lowered):
+                    if event.position + len(event.content) <= offset:
+                        continue
+                    key = (event.marker_id, event.position)
+                    if key not in seen:
+                        seen.add(key)
+                        stream_events.append(event)
+                offset = chunk_end
+                
+                # Rule-based markers are re-evaluated over the events so far
+                chunk_context = {
+                    "content": content[:chunk_end],
+                    "timestamp": timestamp,
+                    "events": list(stream_events),
+                    "emotions": None
+                }
+                await self.contextual_rescan(chunk_context)
                 
                 # Yield incremental results
                 yield {
                     "type": "incremental",
                     "content": chunk,
-                    "markers": result["markers"][-5:],  # Last 5 markers
-                    "timestamp": datetime.utcnow().isoformat()
+                    "markers": [event.to_dict() for event in chunk_context["events"][-5:]],  # Last 5 markers
+                    "timestamp": timestamp.isoformat()
                 }
                 
                 await asyncio.sleep(0.1)  # Small delay for streaming effect
@@ -445,7 +960,7 @@ class MarkerEngine:
                 "result": final_result,
                 "timestamp": datetime.utcnow().isoformat()
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ Stream analysis error: {str(e)}")
             yield {
@@ -456,83 +971,120 @@ class MarkerEngine:
     
     # Helper methods
     
-    def create_timeline(self, events: List[MarkerEvent]) -> List[Dict[str, Any]]:
+    def _cache_put(self, cache: OrderedDict, key: str, value: Dict[str, Any]):
+        """Insert into an LRU cache, evicting the oldest entries"""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > ANALYZE_CACHE_SIZE:
+            cache.popitem(last=False)
+    
+    def create_timeline(self, events: List[MarkerEvent], store: Optional[EventStore] = None) -> List[Dict[str, Any]]:
         """Create timeline visualization data"""
-        timeline = []
-        for event in sorted(events, key=lambda e: e.position):
-            timeline.append({
+        if store is None:
+            ordered = sorted(events, key=operator.attrgetter("position"))
+        else:
+            ordered = [events[index] for index in store.position_order()]
+        # Dict rows are the wire format (pickled from workers, stored as BSON, returned by the API)
+        return [
+            {
                 "position": event.position,
                 "marker_id": event.marker_id,
                 "level": event.level,
                 "content": event.content,
                 "confidence": event.confidence
-            })
-        return timeline
+            }
+            for event in ordered
+        ]
+    
+    def _aggregate_events(self, events: List[MarkerEvent]) -> Dict[str, Any]:
+        """Collect every per-event statistic the profile needs in one pass"""
+        question_count = 0
+        emotion_count = 0
+        event_risks = []
+        by_category = Counter()
+        id_set = set()
+        store = EventStore(events)
+        
+        for event in events:
+            marker_id = event.marker_id
+            id_set.add(marker_id)
+            by_category[(event.metadata or {}).get("category", "unknown")] += 1
+            if "QU" in marker_id:
+                question_count += 1
+            if "EM" in marker_id:
+                emotion_count += 1
+            if "DRIFT_HIGH" in marker_id:
+                event_risks.append("High emotional instability")
+            if "CONFLICT" in event.content.upper():
+                event_risks.append("Conflict indicators present")
+        
+        return {
+            "total": len(events),
+            "question_count": question_count,
+            "emotion_count": emotion_count,
+            "event_risks": event_risks,
+            "by_category": by_category,
+            "by_level": Counter(store.level_counts()),
+            "store": store,
+            "id_set": id_set
+        }
     
     def count_by_level(self, events: List[MarkerEvent]) -> Dict[str, int]:
         """Count markers by level"""
-        counts = {"ATO": 0, "SEM": 0, "CLU": 0, "MEMA": 0}
-        for event in events:
-            counts[event.level] = counts.get(event.level, 0) + 1
-        return counts
+        return EventStore(events).level_counts()
     
-    def get_dominant_level(self, events: List[MarkerEvent]) -> str:
+    def get_dominant_level(self, events: List[MarkerEvent], level_counts: Optional[Dict[str, int]] = None) -> str:
         """Get the most frequent marker level"""
         if not events:
             return "NONE"
-        counts = self.count_by_level(events)
-        return max(counts, key=counts.get)
+        counts = Counter(level_counts if level_counts is not None else self.count_by_level(events))
+        return counts.most_common(1)[0][0]
     
-    def extract_key_patterns(self, events: List[MarkerEvent]) -> List[str]:
+    def extract_key_patterns(self, events: List[MarkerEvent], category_counts: Optional[Counter] = None) -> List[str]:
         """Extract key patterns from detected markers"""
-        patterns = []
-        marker_groups = {}
-        
-        for event in events:
-            category = event.metadata.get("category", "unknown")
-            if category not in marker_groups:
-                marker_groups[category] = []
-            marker_groups[category].append(event)
-        
-        for category, group in marker_groups.items():
-            if len(group) >= 3:
-                patterns.append(f"Repeated {category} pattern ({len(group)} occurrences)")
-        
+        if category_counts is None:
+            category_counts = self._aggregate_events(events)["by_category"]
+        patterns = [
+            f"Repeated {category} pattern ({count} occurrences)"
+            for category, count in category_counts.items()
+            if count >= 3
+        ]
         return patterns[:5]  # Top 5 patterns
     
     def extract_characteristics(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Extract behavioral characteristics"""
         events = context["events"]
         emotions = context.get("emotions", {})
+        aggregates = context.get("_aggregates")
         
         return {
-            "communication_style": self.analyze_communication_style(events),
+            "communication_style": self.analyze_communication_style(events, aggregates),
             "emotional_profile": {
                 "stability": emotions.get("variability", 0),
                 "baseline": emotions.get("home_base", 0),
                 "reactivity": emotions.get("rise_rate", 0)
             },
-            "cognitive_patterns": self.analyze_cognitive_patterns(events)
+            "cognitive_patterns": self.analyze_cognitive_patterns(events, aggregates)
         }
     
-    def analyze_communication_style(self, events: List[MarkerEvent]) -> str:
+    def analyze_communication_style(self, events: List[MarkerEvent], aggregates: Optional[Dict[str, Any]] = None) -> str:
         """Analyze communication style from markers"""
-        question_count = sum(1 for e in events if "QU" in e.marker_id)
-        emotion_count = sum(1 for e in events if "EM" in e.marker_id)
+        if aggregates is None:
+            aggregates = self._aggregate_events(events)
         
-        if question_count > len(events) * 0.3:
+        if aggregates["question_count"] > len(events) * 0.3:
             return "Inquisitive"
-        elif emotion_count > len(events) * 0.4:
+        elif aggregates["emotion_count"] > len(events) * 0.4:
             return "Emotional"
         else:
             return "Balanced"
     
-    def analyze_cognitive_patterns(self, events: List[MarkerEvent]) -> List[str]:
+    def analyze_cognitive_patterns(self, events: List[MarkerEvent], aggregates: Optional[Dict[str, Any]] = None) -> List[str]:
         """Analyze cognitive patterns"""
         patterns = []
         
         # Check for specific marker combinations
-        marker_ids = {e.marker_id for e in events}
+        marker_ids = aggregates["id_set"] if aggregates is not None else {e.marker_id for e in events}
         
         if "C_RE_" in marker_ids and "C_MO_" in marker_ids:
             patterns.append("Complex emotional processing")
@@ -544,16 +1096,13 @@ class MarkerEngine:
     
     def identify_risks(self, context: Dict[str, Any]) -> List[str]:
         """Identify potential risk indicators"""
-        risks = []
-        events = context["events"]
         emotions = context.get("emotions", {})
+        aggregates = context.get("_aggregates")
+        if aggregates is None:
+            aggregates = self._aggregate_events(context["events"])
         
-        # Check for high-risk markers
-        for event in events:
-            if "DRIFT_HIGH" in event.marker_id:
-                risks.append("High emotional instability")
-            if "CONFLICT" in event.content.upper():
-                risks.append("Conflict indicators present")
+        # High-risk markers, one entry per triggering event
+        risks = list(aggregates["event_risks"])
         
         # Check emotion metrics
         if emotions.get("variability", 0) > 0.7:
@@ -561,10 +1110,11 @@ class MarkerEngine:
         
         return risks
     
-    def generate_recommendations(self, context: Dict[str, Any]) -> List[str]:
+    def generate_recommendations(self, context: Dict[str, Any], risks: Optional[List[str]] = None) -> List[str]:
         """Generate actionable recommendations"""
         recommendations = []
-        risks = self.identify_risks(context)
+        if risks is None:
+            risks = self.identify_risks(context)
         
         if "High emotional instability" in risks:
             recommendations.append("Consider emotional regulation techniques")
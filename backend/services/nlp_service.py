@@ -4,41 +4,65 @@ Provides sentiment analysis and named entity recognition
 """
 
 from typing import Dict, List, Any, Optional
+from collections import Counter
+import asyncio
 import re
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+_WORD_RE = re.compile(r'\b\w+\b')
+_SENTENCE_RE = re.compile(r'[.!?]+')
+
+# All entity patterns in one alternation; the named group that matched is the type
+_ENTITY_RE = re.compile(
+    r'(?P<EMAIL>\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b)'
+    r'|(?P<URL>https?://\S+)'
+    r'|(?P<PHONE>\b\d{3}[-.]?\d{3}[-.]?\d{4}\b)'
+    r'|(?P<MONEY>\$\d+(?:,\d{3})*(?:\.\d{2})?)'
+)
+
 class NLPService:
     """Basic NLP service for text analysis"""
     
     def __init__(self):
         # Simple sentiment keywords (can be enhanced with proper NLP libraries)
-        self.positive_words = {
+        self.positive_words = frozenset({
             'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 
             'love', 'like', 'happy', 'joy', 'pleased', 'satisfied', 'awesome'
-        }
-        self.negative_words = {
+        })
+        self.negative_words = frozenset({
             'bad', 'terrible', 'awful', 'horrible', 'hate', 'dislike', 'angry',
             'sad', 'disappointed', 'frustrated', 'annoyed', 'upset', 'worried'
-        }
+        })
+        self.profanity_words = frozenset({'damn', 'hell', 'crap'})  # Basic list
+        # Single lookup table: +1 for positive, -1 for negative keywords
+        self._polarity = {word: 1 for word in self.positive_words}
+        self._polarity.update((word, -1) for word in self.negative_words)
     
     async def analyze(self, text: str) -> Dict[str, Any]:
         """Analyze text for sentiment and basic NLP features"""
+        # CPU-bound tokenizing and matching, keep it off the event loop
+        return await asyncio.to_thread(self._analyze_sync, text)
+    
+    def _analyze_sync(self, text: str) -> Dict[str, Any]:
+        """Synchronous body of analyze()"""
         try:
-            logger.debug(f"🧠 Analyzing text: {text[:50]}...")
+            logger.debug("🧠 Analyzing text: %.50s...", text)
             
             # Basic preprocessing
-            words = re.findall(r'\b\w+\b', text.lower())
+            words = _WORD_RE.findall(text.lower())
+            # Word frequencies are shared by sentiment and feature extraction
+            counts = Counter(words)
             
             # Sentiment analysis
-            sentiment = self._analyze_sentiment(words)
+            sentiment = self._analyze_sentiment(counts, len(words))
             
             # Named entity recognition (basic)
             entities = self._extract_entities(text)
             
             # Language features
-            features = self._extract_features(text, words)
+            features = self._extract_features(text, counts, len(words))
             
             return {
                 'sentiment': sentiment,
@@ -58,11 +82,16 @@ class NLPService:
                 'char_count': len(text) if text else 0
             }
     
-    def _analyze_sentiment(self, words: List[str]) -> Dict[str, Any]:
+    def _analyze_sentiment(self, counts: Counter, total_words: int) -> Dict[str, Any]:
         """Simple sentiment analysis based on keyword matching"""
-        positive_count = sum(1 for word in words if word in self.positive_words)
-        negative_count = sum(1 for word in words if word in self.negative_words)
-        total_words = len(words)
+        # Only the keywords that occur in the text are visited, once each
+        positive_count = negative_count = 0
+        polarity = self._polarity
+        for word in polarity.keys() & counts.keys():
+            if polarity[word] > 0:
+                positive_count += counts[word]
+            else:
+                negative_count += counts[word]
         
         if total_words == 0:
             return {'score': 0.0, 'label': 'neutral'}
@@ -88,37 +117,16 @@ class NLPService:
     
     def _extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """Basic named entity recognition"""
-        entities = []
-        
-        # Email addresses
-        emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
-        for email in emails:
-            entities.append({'text': email, 'type': 'EMAIL'})
-        
-        # Phone numbers (basic pattern)
-        phones = re.findall(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', text)
-        for phone in phones:
-            entities.append({'text': phone, 'type': 'PHONE'})
-        
-        # URLs
-        urls = re.findall(r'https?://[^\s]+', text)
-        for url in urls:
-            entities.append({'text': url, 'type': 'URL'})
-        
-        # Money amounts
-        money = re.findall(r'\$\d+(?:,\d{3})*(?:\.\d{2})?', text)
-        for amount in money:
-            entities.append({'text': amount, 'type': 'MONEY'})
-        
-        return entities
+        # One pass over the text for all entity types
+        return [{'text': match.group(), 'type': match.lastgroup} for match in _ENTITY_RE.finditer(text)]
     
-    def _extract_features(self, text: str, words: List[str]) -> Dict[str, Any]:
+    def _extract_features(self, text: str, counts: Counter, total_words: int) -> Dict[str, Any]:
         """Extract basic linguistic features"""
         return {
-            'sentence_count': len(re.split(r'[.!?]+', text)),
-            'avg_word_length': sum(len(word) for word in words) / max(len(words), 1),
+            'sentence_count': len(_SENTENCE_RE.split(text)),
+            'avg_word_length': sum(len(word) * n for word, n in counts.items()) / max(total_words, 1),
             'question_count': text.count('?'),
             'exclamation_count': text.count('!'),
             'uppercase_ratio': sum(1 for char in text if char.isupper()) / max(len(text), 1),
-            'has_profanity': any(word in ['damn', 'hell', 'crap'] for word in words),  # Basic list
+            'has_profanity': not self.profanity_words.isdisjoint(counts),
         }
\ No newline at end of file
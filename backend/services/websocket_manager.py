@@ -4,86 +4,197 @@ Handles WebSocket connections and message broadcasting
 """
 
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Set, Any, Optional
+from collections import defaultdict
+from dataclasses import dataclass, field
 import asyncio
+import time
+import orjson
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Maximum number of pending outbound messages per client before it is dropped
+SEND_QUEUE_SIZE = 64
+
+# Number of clients served per fan-out step before yielding to the event loop
+BROADCAST_BATCH_SIZE = 50
+
+# Seconds a personal message waits for room in a full send queue
+PERSONAL_SEND_TIMEOUT = 5.0
+
+# Close code for dropped slow clients ("Try Again Later")
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+@dataclass(slots=True)
+class Connection:
+    """State of one connected client"""
+    websocket: WebSocket
+    queue: asyncio.Queue
+    joined_at: float
+    sessions: Set[str] = field(default_factory=set)
+    relay_task: Optional[asyncio.Task] = None
+
 class WebSocketManager:
     """Manages WebSocket connections for real-time updates"""
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.client_sessions: Dict[WebSocket, str] = {}
+        # One record per client; disconnect() drops all of its state at once
+        self._conns: Dict[WebSocket, Connection] = {}
+        # Per-session index so session broadcasts only touch subscribers
+        self._by_session: Dict[str, Set[WebSocket]] = defaultdict(set)
+        # Close handshakes of dropped clients still in flight
+        self._closing: Set[asyncio.Task] = set()
+    
+    @property
+    def active_connections(self):
+        """Connected WebSockets"""
+        return self._conns.keys()
     
     async def connect(self, websocket: WebSocket, session_id: str = None):
         """Accept a new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        
+        # Each client gets its own outbound queue drained by a relay task,
+        # so a slow client never blocks delivery to the others
+        conn = Connection(websocket, asyncio.Queue(maxsize=SEND_QUEUE_SIZE), time.monotonic())
+        self._conns[websocket] = conn
         if session_id:
-            self.client_sessions[websocket] = session_id
-        logger.info(f"✅ WebSocket connected. Total connections: {len(self.active_connections)}")
+            self._add_subscription(conn, session_id)
+        conn.relay_task = asyncio.create_task(self._relay(websocket, conn.queue))
+        logger.info(f"✅ WebSocket connected. Total connections: {len(self._conns)}")
     
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.client_sessions:
-            del self.client_sessions[websocket]
-        logger.info(f"❌ WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        conn = self._conns.pop(websocket, None)
+        if conn is None:
+            return
+        for session_id in conn.sessions:
+            subscribers = self._by_session.get(session_id)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self._by_session[session_id]
+        if conn.relay_task and conn.relay_task is not asyncio.current_task():
+            conn.relay_task.cancel()
+        logger.info(f"❌ WebSocket disconnected. Total connections: {len(self._conns)}")
     
-    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
-        """Send a message to a specific WebSocket"""
+    def active_connections_count(self) -> int:
+        """Number of connected WebSockets"""
+        return len(self._conns)
+    
+    def _add_subscription(self, conn: Connection, session_id: str):
+        """Record a client as subscriber of a session"""
+        conn.sessions.add(session_id)
+        self._by_session[session_id].add(conn.websocket)
+    
+    async def subscribe(self, websocket: WebSocket, session_id: str):
+        """Subscribe a connected WebSocket to a session's updates"""
+        conn = self._conns.get(websocket)
+        if conn is None:
+            return
+        self._add_subscription(conn, session_id)
+        logger.info(f"📡 WebSocket subscribed to session {session_id}")
+    
+    async def _relay(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Drain a client's outbound queue onto its socket"""
         try:
-            await websocket.send_text(json.dumps(message))
+            while True:
+                payload = await queue.get()
+                await websocket.send_bytes(payload)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
+            logger.error(f"Error relaying message to connection: {e}")
             self.disconnect(websocket)
     
-    async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast a message to all connected WebSockets"""
-        if not self.active_connections:
+    def _enqueue(self, websocket: WebSocket, payload: bytes) -> bool:
+        """Queue a pre-serialized message for a client; False if it cannot keep up"""
+        conn = self._conns.get(websocket)
+        if conn is None:
+            return False
+        try:
+            conn.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    def _drop_slow_client(self, websocket: WebSocket):
+        """Disconnect a client that cannot keep up and close its socket"""
+        if websocket not in self._conns:
             return
-        
-        message_text = json.dumps(message)
+        logger.warning("WebSocket send queue full, dropping slow client")
+        self.disconnect(websocket)
+        # Closing ends the client's receive loop in the endpoint as well
+        task = asyncio.create_task(self._close(websocket, SLOW_CLIENT_CLOSE_CODE))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+    
+    async def _close(self, websocket: WebSocket, code: int):
+        """Close a socket, logging instead of raising if it is already gone"""
+        try:
+            await websocket.close(code=code)
+        except Exception as e:
+            logger.error(f"Error closing connection: {e}")
+    
+    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
+        """Send a message to a specific WebSocket"""
+        payload = orjson.dumps(message)
+        if self._enqueue(websocket, payload):
+            return
+        conn = self._conns.get(websocket)
+        if conn is None:
+            return
+        try:
+            # Replies and streamed results wait for room rather than being lost
+            await asyncio.wait_for(conn.queue.put(payload), PERSONAL_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._drop_slow_client(websocket)
+    
+    async def _fan_out(self, connections: List[WebSocket], payload: bytes):
+        """Queue a message for many clients, yielding to the loop between batches"""
         disconnected = []
         
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_text)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {e}")
-                disconnected.append(connection)
+        for start in range(0, len(connections), BROADCAST_BATCH_SIZE):
+            if start:
+                # Let concurrent HTTP requests progress during large fan-outs
+                await asyncio.sleep(0)
+            for connection in connections[start:start + BROADCAST_BATCH_SIZE]:
+                if not self._enqueue(connection, payload):
+                    disconnected.append(connection)
         
-        # Clean up disconnected clients
+        # Clean up clients that could not keep up
         for connection in disconnected:
-            self.disconnect(connection)
+            self._drop_slow_client(connection)
+    
+    async def broadcast(self, message: Dict[str, Any]):
+        """Broadcast a message to all connected WebSockets"""
+        if not self._conns:
+            return
+        
+        # Serialized once; every client is sent the same bytes object
+        payload = orjson.dumps(message)
+        await self._fan_out(list(self._conns), payload)
     
     async def broadcast_to_session(self, message: Dict[str, Any], session_id: str):
         """Broadcast a message to all WebSockets in a specific session"""
-        message_text = json.dumps(message)
-        disconnected = []
-        
-        for connection, conn_session_id in self.client_sessions.items():
-            if conn_session_id == session_id:
-                try:
-                    await connection.send_text(message_text)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to session {session_id}: {e}")
-                    disconnected.append(connection)
+        subscribers = self._by_session.get(session_id)
+        if not subscribers:
+            return
         
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection)
+        payload = orjson.dumps(message)
+        await self._fan_out(list(subscribers), payload)
     
     async def disconnect_all(self):
         """Disconnect all WebSocket connections"""
-        for connection in self.active_connections.copy():
-            try:
-                await connection.close()
-            except Exception as e:
-                logger.error(f"Error closing connection: {e}")
+        connections = list(self._conns)
+        # Close handshakes run concurrently, one slow client does not delay the rest
+        results = await asyncio.gather(
+            *(connection.close() for connection in connections),
+            return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error closing connection: {result}")
             self.disconnect(connection)
-        logger.info("🔌 All WebSocket connections closed")
\ No newline at end of file
+        logger.info("🔌 All WebSocket connections closed")
@@ -0,0 +1,118 @@
+"""
+Tests for the BatchWriter batching utility
+"""
+
+import pytest
+import asyncio
+
+from utils.batching import BatchWriter
+
+
+class RecordingSink:
+    """Async write callable that records every batch it receives"""
+    
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+    
+    async def __call__(self, batch):
+        self.batches.append(list(batch))
+        if self.fail:
+            raise RuntimeError("write failed")
+
+
+class TestBatchWriter:
+    """Test suite for BatchWriter"""
+    
+    @pytest.mark.asyncio
+    async def test_size_triggered_flush(self):
+        """A full batch is written without waiting for the flush interval"""
+        sink = RecordingSink()
+        writer = BatchWriter(sink, batch_size=3, flush_interval=60)
+        writer.start()
+        
+        for item in range(7):
+            await writer.put(item)
+        
+        # Two full batches go out long before the 60s interval
+        for _ in range(100):
+            if len(sink.batches) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        
+        assert sink.batches == [[0, 1, 2], [3, 4, 5]]
+        
+        await writer.stop()
+        assert sink.batches[-1] == [6]
+    
+    @pytest.mark.asyncio
+    async def test_time_triggered_flush(self):
+        """A partial batch is written once the flush interval passes"""
+        sink = RecordingSink()
+        writer = BatchWriter(sink, batch_size=100, flush_interval=0.05)
+        writer.start()
+        
+        await writer.put("a")
+        await writer.put("b")
+        await asyncio.sleep(0.2)
+        
+        assert sink.batches == [["a", "b"]]
+        assert writer.running
+        
+        await writer.stop()
+        assert sink.batches == [["a", "b"]]
+    
+    @pytest.mark.asyncio
+    async def test_stop_drains_buffer(self):
+        """stop() writes everything queued before it and ends the flusher"""
+        sink = RecordingSink()
+        writer = BatchWriter(sink, batch_size=2, flush_interval=60)
+        writer.start()
+        
+        for item in range(5):
+            writer.put_nowait(item)
+        await writer.stop()
+        
+        assert [item for batch in sink.batches for item in batch] == [0, 1, 2, 3, 4]
+        assert all(len(batch) <= 2 for batch in sink.batches)
+        assert not writer.running
+    
+    @pytest.mark.asyncio
+    async def test_flush_keeps_running(self):
+        """flush() writes the buffer and leaves the writer accepting items"""
+        sink = RecordingSink()
+        writer = BatchWriter(sink, batch_size=100, flush_interval=60)
+        writer.start()
+        
+        await writer.put(1)
+        await writer.flush()
+        assert sink.batches == [[1]]
+        assert writer.running
+        
+        await writer.put(2)
+        await writer.stop()
+        assert sink.batches == [[1], [2]]
+    
+    @pytest.mark.asyncio
+    async def test_failed_write_does_not_stop_flusher(self):
+        """A batch whose write raises is dropped and later batches still go out"""
+        sink = RecordingSink(fail=True)
+        writer = BatchWriter(sink, batch_size=1, flush_interval=60)
+        writer.start()
+        
+        await writer.put("x")
+        await writer.put("y")
+        await writer.stop()
+        
+        assert sink.batches == [["x"], ["y"]]
+    
+    @pytest.mark.asyncio
+    async def test_stop_without_start(self):
+        """stop() and flush() are no-ops before start()"""
+        sink = RecordingSink()
+        writer = BatchWriter(sink)
+        
+        await writer.flush()
+        await writer.stop()
+        
+        assert sink.batches == []
@@ -0,0 +1,180 @@
+"""
+Tests for EmotionDynamics window averaging
+"""
+
+import pytest
+import random
+import numpy as np
+
+from services import emotion_dynamics
+from services.emotion_dynamics import (
+    EmotionDynamicsCalculator,
+    EMOTION_MAPPINGS,
+    NEUTRAL_VAD,
+    NUMBA_MIN_EVENTS,
+    _VAD_TABLE
+)
+
+
+@pytest.fixture
+def calculator():
+    """Create EmotionDynamicsCalculator instance"""
+    return EmotionDynamicsCalculator()
+
+
+def baseline_vad(events):
+    """Reference weighted average: np.average over the mapped events' rows"""
+    rows = []
+    weights = []
+    for event in events:
+        for row, prefix in enumerate(EMOTION_MAPPINGS):
+            if event["marker_id"].startswith(prefix):
+                rows.append(row)
+                weights.append(event["confidence"])
+                break
+    if not rows or sum(weights) == 0:
+        return np.array(NEUTRAL_VAD, dtype=np.float32)
+    return np.average(_VAD_TABLE[rows], axis=0, weights=weights)
+
+
+def make_events(marker_ids, count, confidences=None, seed=0):
+    """Events with randomly chosen marker ids and confidences"""
+    rng = random.Random(seed)
+    return [
+        {
+            "marker_id": rng.choice(marker_ids),
+            "confidence": rng.choice(confidences) if confidences else rng.uniform(0.1, 1.0)
+        }
+        for _ in range(count)
+    ]
+
+
+def window_vad(calculator, events):
+    """Run _window_vad into a fresh row"""
+    out = np.empty(3, dtype=np.float32)
+    calculator._window_vad(events, out)
+    return out
+
+
+class TestWindowVad:
+    """Test suite for EmotionDynamicsCalculator._window_vad"""
+    
+    @pytest.mark.parametrize("count", [3, NUMBA_MIN_EVENTS - 1, NUMBA_MIN_EVENTS, 500])
+    def test_mixed_markers_match_baseline(self, calculator, count):
+        """Windows below and above the kernel threshold average like np.average"""
+        events = make_events(list(EMOTION_MAPPINGS) + ["A_XX_", "unknown"], count, seed=count)
+        
+        np.testing.assert_allclose(window_vad(calculator, events), baseline_vad(events), rtol=1e-5, atol=1e-6)
+    
+    @pytest.mark.parametrize("count", [5, NUMBA_MIN_EVENTS * 2])
+    def test_some_zero_weights(self, calculator, count):
+        """Zero-confidence events contribute nothing to the average"""
+        events = make_events(list(EMOTION_MAPPINGS), count, confidences=[0.0, 0.5, 1.0], seed=count)
+        
+        np.testing.assert_allclose(window_vad(calculator, events), baseline_vad(events), rtol=1e-5, atol=1e-6)
+    
+    @pytest.mark.parametrize("count", [5, NUMBA_MIN_EVENTS * 2])
+    def test_all_zero_weights_is_neutral(self, calculator, count):
+        """A window whose mapped events all have zero confidence is neutral"""
+        events = make_events(list(EMOTION_MAPPINGS), count, confidences=[0.0], seed=count)
+        
+        np.testing.assert_array_equal(window_vad(calculator, events), np.array(NEUTRAL_VAD, dtype=np.float32))
+    
+    @pytest.mark.parametrize("count", [1, 7, NUMBA_MIN_EVENTS * 2])
+    def test_single_marker_window(self, calculator, count):
+        """A window of one marker (mixed with unmapped ids) averages to its own row"""
+        events = make_events(["A_AN_", "A_AN_EXTRA", "X_NO_"], count, seed=count)
+        events[0]["marker_id"] = "A_AN_"
+        
+        result = window_vad(calculator, events)
+        
+        np.testing.assert_allclose(result, baseline_vad(events), rtol=1e-5, atol=1e-6)
+        np.testing.assert_array_equal(result, _VAD_TABLE[list(EMOTION_MAPPINGS).index("A_AN_")])
+    
+    @pytest.mark.parametrize("count", [1, NUMBA_MIN_EVENTS * 2])
+    def test_single_marker_zero_weights_is_neutral(self, calculator, count):
+        """The single-marker shortcut keeps the zero-weight neutral result"""
+        events = [{"marker_id": "S_PO_", "confidence": 0.0} for _ in range(count)]
+        
+        np.testing.assert_array_equal(window_vad(calculator, events), np.array(NEUTRAL_VAD, dtype=np.float32))
+    
+    def test_unmapped_window_is_neutral(self, calculator):
+        """A window without mapped markers is neutral"""
+        events = [{"marker_id": "X_NO_", "confidence": 1.0}, {"marker_id": "unknown", "confidence": 0.5}]
+        
+        np.testing.assert_array_equal(window_vad(calculator, events), np.array(NEUTRAL_VAD, dtype=np.float32))
+    
+    @pytest.mark.skipif(emotion_dynamics._accumulate is None, reason="numba not installed")
+    def test_accumulate_kernel(self):
+        """The compiled kernel sums weighted rows and skips negative ids"""
+        ids = np.array([0, 3, -1, 5, 3], dtype=np.int32)
+        weights = np.array([0.5, 1.0, 9.0, 0.0, 0.25], dtype=np.float32)
+        
+        totals = emotion_dynamics._accumulate(ids, weights, _VAD_TABLE)
+        
+        mapped = ids >= 0
+        expected = (_VAD_TABLE[ids[mapped]] * weights[mapped, None]).sum(axis=0)
+        np.testing.assert_allclose(totals[:3], expected, rtol=1e-6)
+        assert totals[3] == pytest.approx(1.75)
+
+
+def same_slot_ids(prefix):
+    """Other "X_YY_" ids that hash to the same perfect-hash slot as prefix"""
+    slot = emotion_dynamics._prefix_slot(prefix)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return [
+        f"{first}_{second}{third}_"
+        for first in letters for second in letters for third in letters
+        if emotion_dynamics._prefix_slot(f"{first}_{second}{third}_") == slot
+        and f"{first}_{second}{third}_" != prefix
+    ]
+
+
+class TestLookupRow:
+    """Test suite for the perfect-hash marker lookup"""
+    
+    @pytest.mark.parametrize("prefix", list(EMOTION_MAPPINGS))
+    def test_mapped_ids(self, calculator, prefix):
+        """Mapped prefixes and ids extending them resolve to their row"""
+        row = list(EMOTION_MAPPINGS).index(prefix)
+        assert calculator._lookup_row(prefix) == row
+        assert calculator._lookup_row(prefix + "JOY") == row
+    
+    @pytest.mark.parametrize("prefix", list(EMOTION_MAPPINGS))
+    def test_same_slot_different_prefix(self, calculator, prefix):
+        """Ids sharing a mapped prefix's slot but not the prefix are unmapped"""
+        near_misses = same_slot_ids(prefix)
+        # Characters 1 and 4 are not hashed
+        near_misses += [prefix[0] + "X" + prefix[2:], prefix[:4] + "X", prefix[:4] + "X" + prefix[4:]]
+        near_misses.append(chr(ord(prefix[0]) + 256) + prefix[1:])
+        
+        assert near_misses
+        for marker_id in near_misses:
+            assert calculator._lookup_row(marker_id) == -1, marker_id
+    
+    @pytest.mark.parametrize("marker_id", ["", "A", "A_", "A_E", "A_EM", "S_PO"])
+    def test_short_ids(self, calculator, marker_id):
+        """Ids shorter than the 5-character prefix are unmapped"""
+        assert calculator._lookup_row(marker_id) == -1
+    
+    def test_matches_prefix_scan(self, calculator):
+        """The slot table agrees with a linear startswith scan over many ids"""
+        letters = "ACEFMNOPS_"
+        rng = random.Random(12)
+        for _ in range(5000):
+            # Mapped prefixes with one character changed, dropped or appended
+            chars = list(rng.choice(list(EMOTION_MAPPINGS)))
+            position = rng.randrange(len(chars) + 1)
+            action = rng.choice(("change", "drop", "append", "keep"))
+            if action == "change" and position < len(chars):
+                chars[position] = rng.choice(letters)
+            elif action == "drop" and position < len(chars):
+                del chars[position]
+            elif action == "append":
+                chars.append(rng.choice(letters))
+            marker_id = "".join(chars)
+            expected = next(
+                (row for row, prefix in enumerate(EMOTION_MAPPINGS) if marker_id.startswith(prefix)),
+                -1
+            )
+            assert calculator._lookup_row(marker_id) == expected, marker_id
@@ -0,0 +1,57 @@
+"""
+Tests for File Processor WhatsApp parsing
+"""
+
+import pytest
+import io
+import zipfile
+
+from services.file_processor import FileProcessor
+
+
+# iOS export: BOM on the first line, U+200E before media and system lines
+IOS_EXPORT = (
+    "\ufeff[01.01.20, 14:30:15] Anna: Hallo\n"
+    "\u200e[01.01.20, 14:31:02] Ben: \u200eimage omitted\n"
+    "[01.01.20, 14:32:40] Anna: Bis später\n"
+)
+
+
+@pytest.fixture
+def processor():
+    """Create FileProcessor instance"""
+    return FileProcessor()
+
+
+class TestWhatsAppParsing:
+    """Test suite for WhatsApp export parsing"""
+    
+    def test_ios_marks_keep_messages(self, processor):
+        """Lines led by a BOM or U+200E are parsed like plain lines"""
+        messages = processor._parse_whatsapp_export(IOS_EXPORT)
+        
+        assert [m['sender'] for m in messages] == ['Anna', 'Ben', 'Anna']
+        assert [m['timestamp'] for m in messages] == [
+            '01.01.20, 14:30:15', '01.01.20, 14:31:02', '01.01.20, 14:32:40'
+        ]
+        assert messages[2]['content'] == 'Bis später'
+        assert all(m['epoch'] is not None for m in messages)
+    
+    def test_non_message_lines_skipped(self, processor):
+        """Lines without a bracketed timestamp and sender are skipped"""
+        lines = ["", "continued text", "[01.01.20, 14:30:15] no sender here", "] x: y"]
+        
+        assert list(processor._parse_whatsapp_lines(lines)) == []
+    
+    @pytest.mark.asyncio
+    async def test_zip_export(self, processor):
+        """Chat files inside a ZIP export are parsed with the same rules"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('_chat.txt', IOS_EXPORT.encode('utf-8'))
+        archive.seek(0)
+        
+        result = await processor._process_zip(archive, 'export.zip')
+        
+        assert result['type'] == 'whatsapp_export'
+        assert [m['sender'] for m in result['messages']] == ['Anna', 'Ben', 'Anna']
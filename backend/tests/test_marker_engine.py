@@ -4,9 +4,11 @@ Tests for Marker Engine Core Service
 
 import pytest
 import asyncio
+import re
 from datetime import datetime
 from unittest.mock import Mock, AsyncMock, patch
 
+from services import marker_engine as engine_module
 from services.marker_engine import MarkerEngine, MarkerDefinition, MarkerEvent
 from services.mongodb_service import MongoDBService
 
@@ -174,6 +176,78 @@ class TestMarkerEngine:
         assert len(events) > 0
         assert any(e["type"] == "complete" for e in events)
     
+    @pytest.mark.asyncio
+    async def test_overlapping_markers_all_found(self, marker_engine):
+        """Hits of different markers over the same text are all reported"""
+        patterns = {
+            "A_AG_": r"agree",
+            "S_DI_": r"dis\w+",
+            "A_SU_": r"sure",
+            "S_NS_": r"not\s+sure",
+            "A_RE_": r"(\w)\1",
+            "A_CA_": r"[A-Z]{3}",
+        }
+        for marker_id, pattern in patterns.items():
+            marker_engine.markers[marker_id] = MarkerDefinition(
+                id=marker_id,
+                level="SEM" if marker_id.startswith("S_") else "ATO",
+                category="test",
+                pattern=pattern,
+                description="Overlapping marker"
+            )
+        marker_engine._ensure_index()
+        
+        content = "I DISAGREE, I'm not sure. Test: I disagree and I agree, sure."
+        hits = sorted((marker.id, start, end) for marker, start, end in marker_engine._scan_hits(content))
+        
+        expected = sorted(
+            (marker.id, match.start(), match.end())
+            for marker in marker_engine.markers.values() if marker.pattern
+            for match in re.finditer(marker.pattern, content, re.IGNORECASE)
+        )
+        assert hits == expected
+        assert ("A_AG_", 5, 10) in hits and ("S_DI_", 2, 10) in hits
+        assert ("A_SU_", 20, 24) in hits and ("S_NS_", 16, 24) in hits
+    
+    @pytest.mark.asyncio
+    async def test_large_scan_in_spawned_pool(self, marker_engine):
+        """Large documents are scanned in spawned workers loaded with the current markers"""
+        content = "a test line\n" * (engine_module.SCAN_PROCESS_THRESHOLD // 12 + 1)
+        timestamp = datetime.now()
+        try:
+            events = await marker_engine.initial_scan({"content": content, "timestamp": timestamp})
+            pool = engine_module._scan_pool
+            assert pool._mp_context.get_start_method() == "spawn"
+            
+            # A changed marker set gets a new pool instead of a stale index
+            marker_engine.markers["A_LI_"] = MarkerDefinition(
+                id="A_LI_", level="ATO", category="test", pattern=r"\bline\b", description="Line marker"
+            )
+            marker_engine._ensure_index()
+            rescanned = await marker_engine.initial_scan({"content": content, "timestamp": timestamp})
+            assert engine_module._scan_pool is not pool
+            assert sum(e.marker_id == "A_LI_" for e in rescanned) == content.count("line")
+        finally:
+            engine_module.shutdown_scan_pool()
+        
+        expected = marker_engine._scan_events(content, timestamp)
+        assert len(events) == content.count("test")
+        assert [(e.marker_id, e.position) for e in events] == [
+            (e.marker_id, e.position) for e in expected if e.marker_id == "A_TE_"
+        ]
+        assert engine_module._scan_pool is None
+    
+    @pytest.mark.asyncio
+    async def test_pool_worker_scans_in_process(self, marker_engine, monkeypatch):
+        """Large documents in an analysis pool worker don't open a nested scan pool"""
+        monkeypatch.setattr(engine_module, "_in_pool_worker", True)
+        monkeypatch.setattr(engine_module, "get_scan_pool", Mock(side_effect=AssertionError))
+        
+        content = "test " * (engine_module.SCAN_PROCESS_THRESHOLD // 5 + 1)
+        events = await marker_engine.initial_scan({"content": content, "timestamp": datetime.now()})
+        
+        assert len(events) == content.count("test")
+    
     @pytest.mark.asyncio
     async def test_timeline_creation(self, marker_engine):
         """Test timeline visualization data creation"""
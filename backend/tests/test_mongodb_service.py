@@ -0,0 +1,131 @@
+"""
+Tests for MongoDB Service batch writes
+"""
+
+import pytest
+from unittest.mock import AsyncMock, Mock
+from pymongo.errors import OperationFailure
+
+from services import mongodb_service
+from services.mongodb_service import MongoDBService, SESSION_TTL_SECONDS
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db_service():
+    """MongoDBService wired to an in-memory Motor mock"""
+    service = MongoDBService()
+    service.client = mongomock_motor.AsyncMongoMockClient()
+    service.db = service.client[service.database_name]
+    service.events_collection = service.db["events_timeline"]
+    service.markers_collection = service.db["markers_definitions"]
+    service.sessions_collection = service.db["analysis_sessions"]
+    service.files_collection = service.db["uploaded_files"]
+    service.emotions_collection = service.db["emotion_metrics"]
+    return service
+
+
+def mock_collection(name: str, create_index=None):
+    """Collection stand-in recording create_index calls"""
+    collection = Mock()
+    collection.name = name
+    collection.create_index = AsyncMock(side_effect=create_index)
+    return collection
+
+
+class TestStoreEventsBatch:
+    """Test suite for MongoDBService.store_events_batch"""
+    
+    @pytest.mark.asyncio
+    async def test_inserts_every_chunk(self, db_service, monkeypatch):
+        """Events split over several chunks are all written and counted"""
+        monkeypatch.setattr(mongodb_service, "INSERT_CHUNK_SIZE", 4)
+        events = [{"session_id": "s1", "marker_id": "A_TE_", "position": i} for i in range(10)]
+        
+        inserted = await db_service.store_events_batch(events)
+        
+        assert inserted == 10
+        stored = await db_service.events_collection.find({"session_id": "s1"}).to_list(None)
+        assert sorted(event["position"] for event in stored) == list(range(10))
+        assert all("created_at" in event for event in stored)
+    
+    @pytest.mark.asyncio
+    async def test_failed_events_do_not_abort_chunk(self, db_service, monkeypatch):
+        """A rejected event is left out of the count while the rest of its chunk is written"""
+        monkeypatch.setattr(mongodb_service, "INSERT_CHUNK_SIZE", 3)
+        events = [{"_id": i, "session_id": "s1"} for i in (1, 1, 2, 3, 4)]
+        
+        inserted = await db_service.store_events_batch(events)
+        
+        assert inserted == 4
+        assert await db_service.events_collection.count_documents({}) == 4
+    
+    @pytest.mark.asyncio
+    async def test_empty_batch(self, db_service):
+        """An empty batch writes nothing"""
+        assert await db_service.store_events_batch([]) == 0
+
+
+class TestCreateIndexes:
+    """Test suite for MongoDBService.create_indexes"""
+    
+    @pytest.mark.asyncio
+    async def test_creates_ttl_indexes(self, db_service):
+        """Every collection gets its indexes, session data a created_at TTL"""
+        await db_service.create_indexes()
+        
+        for collection in (db_service.events_collection, db_service.sessions_collection, db_service.emotions_collection):
+            indexes = await collection.index_information()
+            assert indexes["created_at_1"]["expireAfterSeconds"] == SESSION_TTL_SECONDS
+        assert "file_id_1" in await db_service.files_collection.index_information()
+    
+    @pytest.mark.asyncio
+    async def test_changed_ttl_is_applied_with_collmod(self):
+        """An options conflict on a TTL index updates the TTL instead of failing"""
+        def conflict_on_ttl(keys, **options):
+            if "expireAfterSeconds" in options:
+                raise OperationFailure("Index already exists with different options", code=85)
+        
+        service = MongoDBService()
+        service.db = Mock()
+        service.db.command = AsyncMock()
+        service.markers_collection = mock_collection("markers_definitions")
+        service.events_collection = mock_collection("events_timeline", conflict_on_ttl)
+        service.sessions_collection = mock_collection("analysis_sessions", conflict_on_ttl)
+        service.emotions_collection = mock_collection("emotion_metrics", conflict_on_ttl)
+        service.files_collection = mock_collection("uploaded_files")
+        
+        await service.create_indexes()
+        
+        commands = [call.args[0] for call in service.db.command.await_args_list]
+        assert commands == [
+            {
+                "collMod": name,
+                "index": {"keyPattern": {"created_at": 1}, "expireAfterSeconds": SESSION_TTL_SECONDS}
+            }
+            for name in ("events_timeline", "analysis_sessions", "emotion_metrics")
+        ]
+        assert service.files_collection.create_index.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_failed_index_does_not_skip_the_rest(self):
+        """An index that cannot be created is logged and the others are still created"""
+        def fail_unique(keys, **options):
+            if options.get("unique"):
+                raise OperationFailure("duplicate key", code=11000)
+        
+        service = MongoDBService()
+        service.db = Mock()
+        service.db.command = AsyncMock()
+        service.markers_collection = mock_collection("markers_definitions", fail_unique)
+        service.events_collection = mock_collection("events_timeline")
+        service.sessions_collection = mock_collection("analysis_sessions", fail_unique)
+        service.emotions_collection = mock_collection("emotion_metrics")
+        service.files_collection = mock_collection("uploaded_files")
+        
+        await service.create_indexes()
+        
+        assert service.sessions_collection.create_index.await_count == 2
+        assert service.files_collection.create_index.await_count == 2
+        service.db.command.assert_not_awaited()
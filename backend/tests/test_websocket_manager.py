@@ -0,0 +1,106 @@
+"""
+Tests for WebSocket Manager slow-client handling
+"""
+
+import pytest
+import asyncio
+import orjson
+
+from services import websocket_manager
+from services.websocket_manager import WebSocketManager, SEND_QUEUE_SIZE, SLOW_CLIENT_CLOSE_CODE
+
+
+class FakeWebSocket:
+    """WebSocket stand-in whose sends block until released"""
+    
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.close_codes = []
+        self.released = asyncio.Event()
+        if not blocked:
+            self.released.set()
+    
+    async def accept(self):
+        pass
+    
+    async def send_bytes(self, payload):
+        await self.released.wait()
+        self.sent.append(orjson.loads(payload))
+    
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+async def settle():
+    """Let relay and close tasks run"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def manager():
+    """Create WebSocketManager instance, closing its clients afterwards"""
+    manager = WebSocketManager()
+    yield manager
+    await manager.disconnect_all()
+    await settle()
+
+
+class TestSlowClients:
+    """Test suite for WebSocketManager back-pressure"""
+    
+    @pytest.mark.asyncio
+    async def test_broadcast_closes_slow_client(self, manager):
+        """A client whose queue overflows is closed, the others keep receiving"""
+        slow = FakeWebSocket(blocked=True)
+        fast = FakeWebSocket()
+        await manager.connect(slow)
+        await manager.connect(fast)
+        
+        for i in range(SEND_QUEUE_SIZE + 2):
+            await manager.broadcast({"n": i})
+            await settle()
+        
+        assert slow.close_codes == [SLOW_CLIENT_CLOSE_CODE]
+        assert manager.active_connections_count() == 1
+        assert len(fast.sent) == SEND_QUEUE_SIZE + 2
+        assert fast.close_codes == []
+    
+    @pytest.mark.asyncio
+    async def test_personal_message_waits_for_room(self, manager):
+        """A personal message to a full queue is delivered once the client catches up"""
+        client = FakeWebSocket(blocked=True)
+        await manager.connect(client)
+        # One message is held by the blocked relay, the rest fill the queue
+        for i in range(SEND_QUEUE_SIZE + 1):
+            await manager.send_personal_message({"n": i}, client)
+        await settle()
+        
+        send = asyncio.create_task(manager.send_personal_message({"n": "last"}, client))
+        await settle()
+        assert not send.done()
+        
+        client.released.set()
+        await send
+        await settle()
+        
+        assert client.sent[-1] == {"n": "last"}
+        assert len(client.sent) == SEND_QUEUE_SIZE + 2
+        assert client.close_codes == []
+    
+    @pytest.mark.asyncio
+    async def test_personal_message_timeout_closes_client(self, manager, monkeypatch):
+        """A client that stays stuck past the timeout is disconnected and closed"""
+        monkeypatch.setattr(websocket_manager, "PERSONAL_SEND_TIMEOUT", 0.01)
+        client = FakeWebSocket(blocked=True)
+        await manager.connect(client)
+        
+        for i in range(SEND_QUEUE_SIZE + 2):
+            await manager.send_personal_message({"n": i}, client)
+        await settle()
+        
+        assert client.close_codes == [SLOW_CLIENT_CLOSE_CODE]
+        assert manager.active_connections_count() == 0
+        
+        # Later messages to the dropped client are ignored
+        await manager.send_personal_message({"n": "late"}, client)
@@ -3,56 +3,133 @@
 Parses and evaluates marker activation rules using Domain Specific Language
 """
 
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Set, Tuple, AbstractSet
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import operator
 import re
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Opcodes of compiled rules; OP_PUSH is followed by a marker index
+OP_PUSH = 0
+OP_AND = 1
+OP_OR = 2
+OP_NOT = 3
+OP_FALSE = 4
+
+_BINARY_OPCODES = {'AND': OP_AND, '&': OP_AND, 'OR': OP_OR, '|': OP_OR}
+_NOT_TOKENS = frozenset(('NOT', '!'))
+
+# Binary operators of the token evaluator
+_BINARY_OPS = {'AND': operator.and_, '&': operator.and_, 'OR': operator.or_, '|': operator.or_}
+
+# Marker IDs referenced by a rule (format: X_XX_)
+_MARKER_RE = re.compile(r'\b[A-Z]_[A-Z]{2}_\b')
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """Rule in postfix form over the indices of the markers it references"""
+    ops: array
+    markers: Tuple[str, ...]
+
+@lru_cache(maxsize=1024)
+def _compile(rule: str) -> CompiledRule:
+    """Tokenize a rule once and emit its postfix program"""
+    tokens = ActivationDSLParser._tokenize(rule)
+    markers: List[str] = []
+    index: Dict[str, int] = {}
+    ops = array('i')
+    
+    def push(token: str):
+        clean_marker = token.strip('()')
+        if clean_marker not in index:
+            index[clean_marker] = len(markers)
+            markers.append(clean_marker)
+        ops.extend((OP_PUSH, index[clean_marker]))
+    
+    # Same left-to-right semantics as the token evaluator
+    if tokens[0].upper() == 'NOT':
+        if len(tokens) >= 2:
+            push(tokens[1])
+            ops.append(OP_NOT)
+        else:
+            ops.append(OP_FALSE)
+        return CompiledRule(ops, tuple(markers))
+    
+    push(tokens[0])
+    for i in range(1, len(tokens) - 1, 2):
+        op = tokens[i].upper()
+        if op in _BINARY_OPCODES:
+            push(tokens[i + 1])
+            ops.append(_BINARY_OPCODES[op])
+        elif op in _NOT_TOKENS:
+            # Unary NOT between operands negates the result so far
+            ops.append(OP_NOT)
+    
+    return CompiledRule(ops, tuple(markers))
+
 class ActivationDSLParser:
     """Parser for marker activation rules"""
     
-    def __init__(self):
-        # Supported operators
-        self.operators = {
-            'AND': self._eval_and,
-            'OR': self._eval_or,
-            'NOT': self._eval_not,
-            '&': self._eval_and,
-            '|': self._eval_or,
-            '!': self._eval_not,
-        }
-    
     def parse_and_evaluate(self, rule: str, active_markers: Set[str]) -> bool:
         """Parse and evaluate an activation rule"""
         try:
             if not rule or not rule.strip():
                 return True
             
-            logger.debug(f"🔧 Evaluating rule: {rule} with markers: {active_markers}")
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug("🔧 Evaluating rule: %s with markers: %s", rule, active_markers)
             
-            # Tokenize the rule
-            tokens = self._tokenize(rule)
+            result = self.evaluate(self.compile(rule), active_markers)
             
-            # Parse and evaluate
-            result = self._evaluate_tokens(tokens, active_markers)
-            
-            logger.debug(f"🔧 Rule result: {result}")
+            if debug:
+                logger.debug("🔧 Rule result: %s", result)
             return result
             
         except Exception as e:
             logger.error(f"❌ DSL parsing error for rule '{rule}': {str(e)}")
             return False
     
-    def _tokenize(self, rule: str) -> List[str]:
+    def compile(self, rule: str) -> CompiledRule:
+        """Compile a non-empty rule (cached per rule string)"""
+        return _compile(rule)
+    
+    def evaluate(self, compiled: CompiledRule, active_markers: AbstractSet[str]) -> bool:
+        """Run a compiled rule against the set of active marker ids"""
+        ops = compiled.ops
+        if ops[0] == OP_FALSE:
+            return False
+        
+        # Programs are left folds: PUSH a, then (PUSH b AND|OR) or NOT steps,
+        # so the stack never holds more than the running result
+        markers = compiled.markers
+        result = markers[ops[1]] in active_markers
+        i = 2
+        end = len(ops)
+        while i < end:
+            if ops[i] == OP_NOT:
+                result = not result
+                i += 1
+                continue
+            # Short-circuit: the operand is only looked up when it can change the result
+            if (ops[i + 2] == OP_AND) == result:
+                result = markers[ops[i + 1]] in active_markers
+            i += 3
+        return result
+    
+    @staticmethod
+    def _tokenize(rule: str) -> List[str]:
         """Tokenize the rule into components"""
         # Replace operator symbols with words for easier parsing
         rule = rule.replace('&&', ' AND ').replace('||', ' OR ').replace('!', ' NOT ')
         
-        # Split by whitespace and filter empty tokens
-        tokens = [token.strip() for token in re.split(r'\s+', rule) if token.strip()]
-        
-        return tokens
+        # str.split() splits on whitespace runs and drops empty tokens
+        return rule.split()
     
     def _evaluate_tokens(self, tokens: List[str], active_markers: Set[str]) -> bool:
         """Evaluate tokenized rule"""
@@ -74,12 +151,16 @@ class ActivationDSLParser:
         
         i = 1
         while i < len(tokens) - 1:
-            operator = tokens[i].upper()
-            operand = tokens[i + 1]
+            op = tokens[i].upper()
             
-            if operator in self.operators:
-                operand_value = self._is_marker_active(operand, active_markers)
-                result = self.operators[operator](result, operand_value)
+            if op in _NOT_TOKENS:
+                # Unary NOT between operands negates the result so far
+                result = not result
+            elif op in _BINARY_OPS:
+                binary = _BINARY_OPS[op]
+                # Short-circuit: AND on False and OR on True keep the result
+                if result == (binary is operator.and_):
+                    result = binary(result, self._is_marker_active(tokens[i + 1], active_markers))
             
             i += 2
         
@@ -91,28 +172,12 @@ class ActivationDSLParser:
         clean_marker = marker_id.strip('()')
         return clean_marker in active_markers
     
-    def _eval_and(self, left: bool, right: bool) -> bool:
-        """Evaluate AND operation"""
-        return left and right
-    
-    def _eval_or(self, left: bool, right: bool) -> bool:
-        """Evaluate OR operation"""
-        return left or right
-    
-    def _eval_not(self, left: bool, right: bool = None) -> bool:
-        """Evaluate NOT operation (unary)"""
-        return not left
-    
     def extract_dependencies(self, rule: str) -> List[str]:
         """Extract marker dependencies from a rule"""
         if not rule:
             return []
         
-        # Find all marker IDs (format: X_XX_ where X is alphanumeric)
-        marker_pattern = r'\b[A-Z]_[A-Z]{2}_\b'
-        dependencies = re.findall(marker_pattern, rule)
-        
-        return list(set(dependencies))  # Remove duplicates
+        return list(dict.fromkeys(_MARKER_RE.findall(rule)))  # Remove duplicates, keep rule order
     
     def validate_rule(self, rule: str) -> Dict[str, Any]:
         """Validate a DSL rule syntax"""
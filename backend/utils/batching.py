@@ -0,0 +1,103 @@
+"""
+📦 Batching utility for Marker Engine
+Collects items from producers and hands them to a writer in batches
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Queue marker telling the flusher to write what it holds and exit
+_STOP = object()
+
+class BatchWriter:
+    """
+    Buffers items and passes them to an async write callable from a background
+    task, in batches of up to batch_size or whatever arrived within flush_interval
+    """
+    
+    def __init__(
+        self,
+        write: Callable[[List[Any]], Awaitable[Any]],
+        batch_size: int = 500,
+        flush_interval: float = 0.1,
+        name: str = "batch"
+    ):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background flusher is started"""
+        return self._task is not None
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def put(self, item: Any):
+        """Queue an item for the next batch (returns immediately)"""
+        await self._queue.put(item)
+    
+    def put_nowait(self, item: Any):
+        """Queue an item from synchronous code"""
+        self._queue.put_nowait(item)
+    
+    async def flush(self):
+        """Write everything buffered so far, keeping the flusher running"""
+        if self._task is None:
+            return
+        await self.stop()
+        self.start()
+    
+    async def stop(self):
+        """Write everything still buffered and stop the flusher"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        task, self._task = self._task, None
+        await task
+    
+    async def _run(self):
+        """Collect up to batch_size items or wait flush_interval, then write"""
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._write(batch)
+            if stopping:
+                return
+    
+    async def _write(self, batch: List[Any]):
+        """Hand one batch to the writer; a failed batch is logged, not retried"""
+        try:
+            await self.write(batch)
+        except Exception as e:
+            logger.error(f"❌ Error writing {self.name} batch of {len(batch)} items: {str(e)}")
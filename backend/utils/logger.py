@@ -7,6 +7,14 @@ import logging
 import sys
 from typing import Optional
 
+# One stdout handler shared by every logger created through setup_logger
+_FORMATTER = logging.Formatter(
+    '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+_HANDLER = logging.StreamHandler(sys.stdout)
+_HANDLER.setFormatter(_FORMATTER)
+
 def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     """Setup logger with consistent formatting"""
     
@@ -15,22 +23,9 @@ def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     if logger.handlers:
         return logger
     
-    # Set level
-    log_level = getattr(logging, level.upper(), logging.INFO)
-    logger.setLevel(log_level)
-    
-    # Create console handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(log_level)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
-    
-    # Add handler to logger
-    logger.addHandler(handler)
+    # Level is enforced on the logger; the shared handler passes everything through
+    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+    logger.addHandler(_HANDLER)
+    logger.propagate = False
     
-    return logger
\ No newline at end of file
+    return logger
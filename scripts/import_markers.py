@@ -4,61 +4,130 @@ Import 127 validated markers into MongoDB
 """
 
 import os
+import re
 import sys
 import json
 import asyncio
-from datetime import datetime
-from typing import List, Dict, Any
-from pymongo import MongoClient
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Iterator
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import BulkWriteError
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # MongoDB connection
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DATABASE_NAME = "marker_engine"
 COLLECTION_NAME = "markers"
+BULK_CHUNK_SIZE = 1000
+
+# (keys, options) for every index the markers collection needs
+MARKER_INDEXES = [
+    ([("marker_id", 1)], {"unique": True}),
+    ([("level", 1)], {}),
+    ([("status", 1)], {}),
+    ([("created_at", -1)], {}),
+]
+
+def ensure_indexes(collection) -> int:
+    """Create missing marker indexes concurrently; returns how many were created"""
+    existing = set(collection.index_information())
+    missing = [
+        (keys, opts) for keys, opts in MARKER_INDEXES
+        if "_".join(f"{field}_{direction}" for field, direction in keys) not in existing
+    ]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = [executor.submit(collection.create_index, keys, **opts) for keys, opts in missing]
+            for future in futures:
+                future.result()
+    return len(missing)
+
+def _parse_json(data: bytes) -> Any:
+    """Parse JSON with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 def load_markers_from_file(filepath: str) -> List[Dict]:
     """Load markers from JSON or YAML file"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        if filepath.endswith('.json'):
-            return json.load(f)
-        elif filepath.endswith('.yaml') or filepath.endswith('.yml'):
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    
+    if filepath.endswith('.json'):
+        return _parse_json(data)
+    elif filepath.endswith('.yaml') or filepath.endswith('.yml'):
+        import yaml
+        return yaml.safe_load(data)
+    else:
+        # Try JSON first
+        try:
+            return _parse_json(data)
+        except ValueError:
             import yaml
-            return yaml.safe_load(f)
-        else:
-            # Try JSON first
-            try:
-                return json.load(f)
-            except:
-                import yaml
-                return yaml.safe_load(f)
+            return yaml.safe_load(data)
+
+def iter_markers(filepath: str) -> Iterator[Dict]:
+    """Yield markers one at a time, streaming JSON files when ijson is installed"""
+    if ijson is not None and not filepath.endswith(('.yaml', '.yml')):
+        with open(filepath, 'rb') as f:
+            head = f.read(64).lstrip()
+            f.seek(0)
+            # A bare array, or an object with a "markers" array
+            if head.startswith(b'['):
+                yield from ijson.items(f, 'item', use_float=True)
+                return
+            if head.startswith(b'{'):
+                yield from ijson.items(f, 'markers.item', use_float=True)
+                return
+    
+    markers = load_markers_from_file(filepath)
+    if isinstance(markers, dict) and 'markers' in markers:
+        markers = markers['markers']
+    yield from markers
 
 def validate_marker(marker: Dict) -> bool:
-    """Validate marker structure"""
-    required_fields = ['marker_id', 'level', 'pattern']
-    return all(field in marker for field in required_fields)
+    """Validate marker structure and that its pattern compiles"""
+    if not ('marker_id' in marker and 'level' in marker and 'pattern' in marker):
+        return False
+    return pattern_compiles(marker['pattern'])
+
+def pattern_compiles(pattern: str) -> bool:
+    """Whether the engine can compile the pattern"""
+    if not pattern:
+        return True
+    try:
+        re.compile(pattern)
+        return True
+    except re.error:
+        return False
 
-def enrich_marker(marker: Dict) -> Dict:
+def enrich_marker(marker: Dict, now: datetime = None) -> Dict:
     """Add metadata to marker"""
-    marker['created_at'] = datetime.utcnow()
-    marker['updated_at'] = datetime.utcnow()
+    if now is None:
+        now = datetime.now(timezone.utc)
+    marker['created_at'] = marker['updated_at'] = now
     marker['version'] = "1.0.0"
     marker['status'] = 'active'
     
     # Ensure proper types
-    if 'confidence_threshold' not in marker:
-        marker['confidence_threshold'] = 0.7
-    
-    if 'dependencies' not in marker:
-        marker['dependencies'] = []
-    
-    if 'metadata' not in marker:
-        marker['metadata'] = {}
+    marker.setdefault('confidence_threshold', 0.7)
+    marker.setdefault('dependencies', [])
+    marker.setdefault('metadata', {})
     
     return marker
 
-def import_markers(markers: List[Dict], mongodb_uri: str = None, dry_run: bool = False):
+def import_markers(markers: Iterable[Dict], mongodb_uri: str = None, dry_run: bool = False):
     """Import markers into MongoDB"""
     
     if dry_run:
@@ -68,28 +137,41 @@ def import_markers(markers: List[Dict], mongodb_uri: str = None, dry_run: bool =
     valid_markers = []
     invalid_markers = []
     
+    # All markers of one import share the same timestamps
+    now = datetime.now(timezone.utc)
+    loaded = 0
     for i, marker in enumerate(markers):
+        loaded += 1
         if validate_marker(marker):
-            valid_markers.append(enrich_marker(marker))
+            valid_markers.append(enrich_marker(marker, now))
         else:
             invalid_markers.append((i, marker))
     
-    print(f"✅ Valid markers: {len(valid_markers)}")
-    print(f"❌ Invalid markers: {len(invalid_markers)}")
+    lines = [
+        f"📂 Loaded {loaded} markers",
+        f"✅ Valid markers: {len(valid_markers)}",
+        f"❌ Invalid markers: {len(invalid_markers)}",
+    ]
     
     if invalid_markers:
-        print("\n⚠️ Invalid markers found:")
-        for idx, marker in invalid_markers[:5]:  # Show first 5
-            print(f"  - Index {idx}: {marker.get('marker_id', 'NO_ID')}")
+        lines.append("\n⚠️ Invalid markers found:")
+        lines.extend(  # Show first 5
+            f"  - Index {idx}: {marker.get('marker_id', 'NO_ID')}"
+            for idx, marker in invalid_markers[:5]
+        )
+    print("\n".join(lines))
     
     if not valid_markers:
         print("❌ No valid markers to import")
         return
     
     if dry_run:
-        print("\n📋 Sample markers to be imported:")
-        for marker in valid_markers[:3]:
-            print(f"  - {marker['marker_id']} ({marker['level']}): {marker.get('description', 'No description')}")
+        lines = ["\n📋 Sample markers to be imported:"]
+        lines.extend(
+            f"  - {marker['marker_id']} ({marker['level']}): {marker.get('description', 'No description')}"
+            for marker in valid_markers[:3]
+        )
+        print("\n".join(lines))
         return
     
     # Connect to MongoDB
@@ -103,39 +185,46 @@ def import_markers(markers: List[Dict], mongodb_uri: str = None, dry_run: bool =
         print(f"✅ Connected to MongoDB")
         
         # Create indexes
-        collection.create_index("marker_id", unique=True)
-        collection.create_index("level")
-        collection.create_index("status")
-        collection.create_index([("created_at", -1)])
-        print(f"✅ Indexes created")
+        created = ensure_indexes(collection)
+        print(f"✅ Indexes ready ({created} created)")
         
         # Import markers with upsert
-        operations = []
-        for marker in valid_markers:
-            operations.append({
-                'update_one': {
-                    'filter': {'marker_id': marker['marker_id']},
-                    'update': {'$set': marker},
-                    'upsert': True
-                }
-            })
+        operations = [
+            UpdateOne({'marker_id': marker['marker_id']}, {'$set': marker}, upsert=True)
+            for marker in valid_markers
+        ]
         
-        # Bulk write
+        # Unordered bulk writes in bounded chunks
         if operations:
-            result = collection.bulk_write(operations)
-            print(f"\n📊 Import Results:")
-            print(f"  - Inserted: {result.upserted_count}")
-            print(f"  - Modified: {result.modified_count}")
-            print(f"  - Total processed: {len(operations)}")
+            upserted = modified = failed = 0
+            for start in range(0, len(operations), BULK_CHUNK_SIZE):
+                chunk = operations[start:start + BULK_CHUNK_SIZE]
+                try:
+                    result = collection.bulk_write(chunk, ordered=False)
+                    upserted += result.upserted_count
+                    modified += result.modified_count
+                except BulkWriteError as e:
+                    details = e.details
+                    upserted += details.get('nUpserted', 0)
+                    modified += details.get('nModified', 0)
+                    failed += len(details.get('writeErrors', []))
+            
+            lines = ["\n📊 Import Results:", f"  - Inserted: {upserted}", f"  - Modified: {modified}"]
+            if failed:
+                lines.append(f"  - Failed: {failed}")
+            lines.append(f"  - Total processed: {len(operations)}")
             
             # Verify
-            total_count = collection.count_documents({})
-            print(f"  - Total markers in DB: {total_count}")
+            total_count = collection.estimated_document_count()
+            lines.append(f"  - Total markers in DB: {total_count}")
             
             # Show sample
-            print(f"\n📋 Sample markers in database:")
-            for marker in collection.find().limit(3):
-                print(f"  - {marker['marker_id']} ({marker['level']})")
+            lines.append("\n📋 Sample markers in database:")
+            lines.extend(
+                f"  - {marker['marker_id']} ({marker['level']})"
+                for marker in collection.find().limit(3)
+            )
+            print("\n".join(lines))
         
         print(f"\n✅ Import completed successfully!")
         
@@ -194,14 +283,10 @@ def main():
         sys.exit(1)
     
     try:
-        markers = load_markers_from_file(args.file)
-        if isinstance(markers, dict) and 'markers' in markers:
-            markers = markers['markers']
-        
-        print(f"📂 Loaded {len(markers)} markers from {args.file}")
+        print(f"📂 Reading markers from {args.file}")
         
-        # Import markers
-        import_markers(markers, args.mongodb_uri, args.dry_run)
+        # Import markers, parsed as they are consumed
+        import_markers(iter_markers(args.file), args.mongodb_uri, args.dry_run)
         
     except Exception as e:
         print(f"❌ Error: {e}")